@@ -0,0 +1,48 @@
+"""add composite indexes for async task listing
+
+Revision ID: add_task_list_indexes
+Revises: add_request_params
+Create Date: 2026-10-15
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers
+revision = 'add_task_list_indexes'
+down_revision = 'add_request_params'
+branch_labels = None
+depends_on = None
+
+
+def _existing_indexes() -> set:
+    """async_tasks 表上已存在的索引名（应用启动时 create_tables 可能已建好这些索引）"""
+    return {index['name'] for index in sa.inspect(op.get_bind()).get_indexes('async_tasks')}
+
+
+def upgrade() -> None:
+    """为任务列表的过滤 + 排序查询添加复合索引"""
+    existing = _existing_indexes()
+    if 'idx_async_tasks_type_status_created' not in existing:
+        op.create_index(
+            'idx_async_tasks_type_status_created',
+            'async_tasks',
+            ['task_type', 'status', sa.text('created_at DESC')],
+            unique=False
+        )
+    if 'idx_async_tasks_user_created' not in existing:
+        op.create_index(
+            'idx_async_tasks_user_created',
+            'async_tasks',
+            ['user_id', 'created_at'],
+            unique=False
+        )
+
+
+def downgrade() -> None:
+    """移除任务列表复合索引"""
+    existing = _existing_indexes()
+    if 'idx_async_tasks_user_created' in existing:
+        op.drop_index('idx_async_tasks_user_created', table_name='async_tasks')
+    if 'idx_async_tasks_type_status_created' in existing:
+        op.drop_index('idx_async_tasks_type_status_created', table_name='async_tasks')
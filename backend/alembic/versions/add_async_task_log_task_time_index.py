@@ -0,0 +1,42 @@
+"""add (task_id, timestamp) index to async_task_logs
+
+Revision ID: add_task_log_time_index
+Revises: add_task_list_indexes
+Create Date: 2026-10-15
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers
+revision = 'add_task_log_time_index'
+down_revision = 'add_task_list_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """为按任务查询日志并按时间排序添加复合索引"""
+    # async_task_logs 表由应用启动时的 create_all 创建，可能尚不存在
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table('async_task_logs'):
+        return
+    # 应用启动时 create_tables 会补建缺失的索引，索引可能已存在
+    if 'idx_async_task_logs_task_time' in {index['name'] for index in inspector.get_indexes('async_task_logs')}:
+        return
+    op.create_index(
+        'idx_async_task_logs_task_time',
+        'async_task_logs',
+        ['task_id', 'timestamp'],
+        unique=False
+    )
+
+
+def downgrade() -> None:
+    """移除任务日志复合索引"""
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table('async_task_logs'):
+        return
+    if 'idx_async_task_logs_task_time' not in {index['name'] for index in inspector.get_indexes('async_task_logs')}:
+        return
+    op.drop_index('idx_async_task_logs_task_time', table_name='async_task_logs')
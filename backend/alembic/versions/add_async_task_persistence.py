@@ -17,6 +17,17 @@ down_revision = 'faf9a428a751'  # 依赖于上一个迁移
 branch_labels = None
 depends_on = None
 
+# (索引名, 列, 是否唯一)
+_INDEXES = [
+    ('ix_async_tasks_task_id', ['task_id'], True),
+    ('ix_async_tasks_task_type', ['task_type'], False),
+    ('ix_async_tasks_status', ['status'], False),
+    ('ix_async_tasks_user_id', ['user_id'], False),
+    ('ix_async_tasks_created_at', ['created_at'], False),
+    ('idx_async_tasks_status_created', ['status', 'created_at'], False),
+    ('idx_async_tasks_user_status', ['user_id', 'status'], False),
+]
+
 
 def upgrade() -> None:
     """创建 async_tasks 表"""
@@ -40,14 +51,19 @@ def upgrade() -> None:
         sa.PrimaryKeyConstraint('id')
     )
 
-    # 创建索引
-    op.create_index('ix_async_tasks_task_id', 'async_tasks', ['task_id'], unique=True)
-    op.create_index('ix_async_tasks_task_type', 'async_tasks', ['task_type'], unique=False)
-    op.create_index('ix_async_tasks_status', 'async_tasks', ['status'], unique=False)
-    op.create_index('ix_async_tasks_user_id', 'async_tasks', ['user_id'], unique=False)
-    op.create_index('ix_async_tasks_created_at', 'async_tasks', ['created_at'], unique=False)
-    op.create_index('idx_async_tasks_status_created', 'async_tasks', ['status', 'created_at'], unique=False)
-    op.create_index('idx_async_tasks_user_status', 'async_tasks', ['user_id', 'status'], unique=False)
+    # 建表与建索引分开执行：PostgreSQL 下逐个 CONCURRENTLY 建索引，避免长时间阻塞写入
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        # CONCURRENTLY 不能在事务中执行，先提交建表事务再进入自动提交模式
+        with op.get_context().autocommit_block():
+            for name, columns, unique in _INDEXES:
+                op.execute(
+                    f"CREATE {'UNIQUE ' if unique else ''}INDEX CONCURRENTLY IF NOT EXISTS "
+                    f"{name} ON async_tasks ({', '.join(columns)})"
+                )
+    else:
+        for name, columns, unique in _INDEXES:
+            op.create_index(name, 'async_tasks', columns, unique=unique)
 
 
 def downgrade() -> None:
@@ -171,7 +171,7 @@ async def analyze_requirements_async(
     from app.services.async_task_manager import task_manager
 
     # 从系统设置加载并发配置
-    task_manager.load_config_from_db(db)
+    await task_manager.load_config_from_db_async(db)
 
     # 需求分析是单步骤任务
     task_id = task_manager.create_task("requirement_analysis", total_batches=1)
@@ -377,7 +377,7 @@ async def generate_test_points_async(
     from app.services.async_task_manager import task_manager
 
     # 从系统设置加载并发配置
-    task_manager.load_config_from_db(db)
+    await task_manager.load_config_from_db_async(db)
 
     # 计算批次数（基于系统设置的并发数）
     concurrency = task_manager.max_concurrent_tasks
@@ -604,7 +604,7 @@ async def design_test_cases_async(
     from app.services.async_task_manager import task_manager
     
     # 从系统设置加载并发配置
-    task_manager.load_config_from_db(db)
+    await task_manager.load_config_from_db_async(db)
     
     # 计算批次数（生成 + 优化，各占50%进度）
     concurrency = task_manager.max_concurrent_tasks
@@ -898,7 +898,7 @@ async def optimize_test_cases_batch(
     from app.services.async_task_manager import task_manager
     
     # 从系统设置加载并发配置
-    task_manager.load_config_from_db(db)
+    await task_manager.load_config_from_db_async(db)
     
     # 计算批次数（每个用例作为一个批次）
     total_batches = len(request.test_cases)
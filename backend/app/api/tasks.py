@@ -2,12 +2,18 @@
 异步任务管理 API
 提供任务的列表查询、详情查看、批量操作等功能
 """
-from typing import Optional, List
-from fastapi import APIRouter, Depends, Query, HTTPException, status
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+import base64
+import time
+from datetime import datetime
+from typing import Optional, List, Tuple, Dict, Any
+import orjson
+from fastapi import APIRouter, Depends, Query, HTTPException, Response, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import func, select, tuple_, delete, update, text
 from pydantic import BaseModel
 
+from app.config import settings
 from app.database import get_db
 from app.core.dependencies import get_current_admin_user
 from app.models.user import User, UserRole
@@ -20,43 +26,200 @@ from app.services.async_task_manager import task_manager
 
 router = APIRouter()
 
+# 可取消的任务状态
+_CANCELLABLE_STATUSES = (
+    AsyncTaskStatus.PENDING,
+    AsyncTaskStatus.RUNNING,
+)
+
+# 任务列表允许的排序字段（白名单，避免按任意属性排序）
+_SORT_COLUMNS = {
+    "created_at": AsyncTask.created_at,
+    "started_at": AsyncTask.started_at,
+    "status": AsyncTask.status,
+    "task_type": AsyncTask.task_type,
+}
+
+# 终态任务状态（可清理）
+_FINAL_STATUSES = (
+    AsyncTaskStatus.COMPLETED,
+    AsyncTaskStatus.FAILED,
+    AsyncTaskStatus.CANCELLED,
+    AsyncTaskStatus.TIMEOUT,
+)
+
+# 任务统计缓存（管理页面频繁轮询）
+_STATS_CACHE_TTL = 5.0  # 秒
+_stats_cache: Dict[str, Any] = {"data": None, "version": None, "expires_at": 0.0}
+
+# 简单的单列查询直接走原生 SQL，跳过 ORM 行对象构建
+# 注意：status 列以枚举名（如 PENDING）存储，需经 AsyncTaskStatus[...] 转换
+_STATS_SQL = f"SELECT status, count(*) FROM {AsyncTask.__tablename__} GROUP BY status"
+_STATUS_PROBE_SQL = text(f"SELECT status FROM {AsyncTask.__tablename__} WHERE task_id = :task_id")
+
 
 # ============ 辅助函数 ============
 
-def _generate_task_name(task: AsyncTask, db: Session) -> Optional[str]:
-    """生成任务名称
+def _invalidate_task_stats() -> None:
+    """使任务统计缓存失效（直接修改数据库中的任务后调用）"""
+    _stats_cache["data"] = None
+
+
+def _delete_final_tasks(db: Session, batch_size: int) -> int:
+    """分批删除所有终态任务并逐批提交，返回删除总数"""
+    deleted_count = 0
+    while True:
+        batch_ids = (
+            select(AsyncTask.id)
+            .where(AsyncTask.status.in_(_FINAL_STATUSES))
+            .limit(batch_size)
+        )
+        result = db.execute(
+            delete(AsyncTask)
+            .where(AsyncTask.id.in_(batch_ids))
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+        deleted_count += result.rowcount
+        if result.rowcount < batch_size:
+            return deleted_count
+
+
+def _generate_task_names(params_list: List[Optional[Dict[str, Any]]], db: Session) -> List[Optional[str]]:
+    """批量生成任务名称
 
     格式: 项目名-模块名-需求文档名
-    如果无法获取完整信息，返回 None 或部分名称
+    如果无法获取完整信息，返回 None 或部分名称。
+    项目、模块、需求文件各用一次 IN 查询，避免逐个任务查询。
     """
-    if not task.request_params:
-        return None
-
-    params = task.request_params
-    parts = []
-
-    # 获取项目名
-    if params.get("project_id"):
-        project = db.query(Project).filter(Project.id == params["project_id"]).first()
-        if project:
-            parts.append(project.name)
-
-    # 获取模块名
-    if params.get("module_id"):
-        module = db.query(Module).filter(Module.id == params["module_id"]).first()
-        if module:
-            parts.append(module.name)
-
-    # 获取文件名（移除扩展名）
-    if params.get("file_id"):
-        file = db.query(RequirementFile).filter(
-            RequirementFile.id == params["file_id"]
-        ).first()
-        if file:
-            filename = file.filename.rsplit('.', 1)[0] if '.' in file.filename else file.filename
+    project_ids = {p["project_id"] for p in params_list if p and p.get("project_id")}
+    module_ids = {p["module_id"] for p in params_list if p and p.get("module_id")}
+    file_ids = {p["file_id"] for p in params_list if p and p.get("file_id")}
+
+    project_names = dict(
+        db.query(Project.id, Project.name).filter(Project.id.in_(project_ids)).all()
+    ) if project_ids else {}
+    module_names = dict(
+        db.query(Module.id, Module.name).filter(Module.id.in_(module_ids)).all()
+    ) if module_ids else {}
+    filenames = dict(
+        db.query(RequirementFile.id, RequirementFile.filename).filter(RequirementFile.id.in_(file_ids)).all()
+    ) if file_ids else {}
+
+    names = []
+    for params in params_list:
+        if not params:
+            names.append(None)
+            continue
+
+        parts = []
+
+        # 获取项目名
+        project_name = project_names.get(params.get("project_id"))
+        if project_name:
+            parts.append(project_name)
+
+        # 获取模块名
+        module_name = module_names.get(params.get("module_id"))
+        if module_name:
+            parts.append(module_name)
+
+        # 获取文件名（移除扩展名）
+        filename = filenames.get(params.get("file_id"))
+        if filename:
+            filename = filename.rsplit('.', 1)[0] if '.' in filename else filename
             parts.append(filename)
 
-    return "-".join(parts) if parts else None
+        names.append("-".join(parts) if parts else None)
+
+    return names
+
+
+def _generate_task_name(params: Optional[Dict[str, Any]], db: Session) -> Optional[str]:
+    """生成单个任务名称，见 _generate_task_names"""
+    return _generate_task_names([params], db)[0]
+
+
+# 任务列表查询的列（Core select，直接返回行数据，避免构造 ORM 实例和懒加载 creator）
+_TASK_LIST_COLUMNS = (
+    AsyncTask.id,
+    AsyncTask.task_id,
+    AsyncTask.task_type,
+    AsyncTask.status,
+    AsyncTask.progress,
+    AsyncTask.total_batches,
+    AsyncTask.completed_batches,
+    AsyncTask.message,
+    AsyncTask.result,
+    AsyncTask.error,
+    AsyncTask.user_id,
+    AsyncTask.created_at,
+    AsyncTask.started_at,
+    AsyncTask.completed_at,
+    AsyncTask.request_params,
+    User.username.label("user_username"),
+    User.email.label("user_email"),
+)
+
+
+def _encode_cursor(created_at: datetime, task_pk: int) -> str:
+    """将最后一行的 (created_at, id) 编码为不透明游标"""
+    raw = f"{created_at.isoformat()}|{task_pk}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def _decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """解码游标，返回 (created_at, id)"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+        created_at, task_pk = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(task_pk)
+    except (ValueError, UnicodeError):
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"无效的分页游标: {cursor}"
+        )
+
+
+def _json_response(payload: Dict[str, Any]) -> Response:
+    """用 orjson 直接序列化响应体
+
+    跳过响应模型对已构建字典的重复校验和 jsonable_encoder 编码；
+    datetime/枚举由 orjson 在 C 层处理。端点上的 response_model 仍保留用于接口文档。
+    """
+    return Response(
+        content=orjson.dumps(payload, option=orjson.OPT_NON_STR_KEYS),
+        media_type="application/json"
+    )
+
+
+def _task_row_to_dict(row) -> Dict[str, Any]:
+    """将列表查询的行映射转换为与 AsyncTask.to_dict_with_user() 结构一致的字典
+
+    datetime 和枚举保持原始对象，由 orjson 在序列化时直接处理
+    """
+    return {
+        "id": row["id"],
+        "task_id": row["task_id"],
+        "task_type": row["task_type"],
+        "status": row["status"],
+        "progress": row["progress"],
+        "total_batches": row["total_batches"],
+        "completed_batches": row["completed_batches"],
+        "message": row["message"],
+        "result": row["result"],
+        "error": row["error"],
+        "user_id": row["user_id"],
+        "created_at": row["created_at"],
+        "started_at": row["started_at"],
+        "completed_at": row["completed_at"],
+        "request_params": row["request_params"],
+        "user": {
+            "id": row["user_id"],
+            "username": row["user_username"],
+            "email": row["user_email"]
+        },
+    }
 
 
 # ============ 请求/响应模型 ============
@@ -64,9 +227,10 @@ def _generate_task_name(task: AsyncTask, db: Session) -> Optional[str]:
 class TaskListResponse(BaseModel):
     """任务列表响应"""
     tasks: List[dict]
-    total: int
+    total: Optional[int]  # 使用游标分页或 include_total=false 时不统计总数，返回 None
     page: int
     page_size: int
+    next_cursor: Optional[str] = None  # 下一页游标（仅按 created_at 排序时提供）
 
 
 class TaskDetailResponse(BaseModel):
@@ -101,10 +265,12 @@ class TaskLogResponse(BaseModel):
 
 
 # ============ API 端点 ============
+# 只读端点定义为普通函数，由 FastAPI 在线程池中执行，同步数据库查询不会阻塞事件循环；
+# 需要调用任务管理器（依赖事件循环）的端点保持 async。
 
 @router.get("", response_model=TaskListResponse)
 @router.get("/", response_model=TaskListResponse)
-async def get_tasks(
+def get_tasks(
     status: Optional[str] = Query(None, description="按状态过滤"),
     task_type: Optional[str] = Query(None, description="按任务类型过滤"),
     user_id: Optional[int] = Query(None, description="按用户 ID 过滤"),
@@ -112,67 +278,155 @@ async def get_tasks(
     page_size: int = Query(20, ge=1, le=100, description="每页数量"),
     sort_by: str = Query("created_at", description="排序字段"),
     order: str = Query("desc", pattern="^(asc|desc)$", description="排序方向"),
+    cursor: Optional[str] = Query(None, description="游标分页：上一页返回的 next_cursor"),
+    include_total: bool = Query(True, description="是否统计总数"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_admin_user)
 ):
     """获取任务列表（管理员专用）
 
-    支持按状态、类型、用户过滤，支持排序和分页
+    支持按状态、类型、用户过滤，支持排序和分页。
+    按 created_at 排序时支持基于 (created_at, id) 的游标分页，
+    传入 cursor 时忽略 page 且不统计总数。
+    总数通过窗口函数 COUNT(*) OVER () 随分页查询一并返回，无需额外的 COUNT 查询。
     """
-    # 构建查询
-    query = db.query(AsyncTask)
+    # 构建查询（Core select，联表获取用户信息）
+    stmt = select(*_TASK_LIST_COLUMNS).outerjoin(User, User.id == AsyncTask.user_id)
+    filters = []
 
     if status:
         try:
             status_enum = AsyncTaskStatus(status)
-            query = query.filter(AsyncTask.status == status_enum)
+            filters.append(AsyncTask.status == status_enum)
         except ValueError:
             raise HTTPException(
-                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                status_code=422,  # 参数 status 覆盖了 fastapi.status 模块
                 detail=f"无效的状态值: {status}"
             )
 
     if task_type:
-        query = query.filter(AsyncTask.task_type == task_type)
+        filters.append(AsyncTask.task_type == task_type)
 
     if user_id:
-        query = query.filter(AsyncTask.user_id == user_id)
+        filters.append(AsyncTask.user_id == user_id)
+
+    if filters:
+        stmt = stmt.where(*filters)
 
-    # 排序
-    order_column = getattr(AsyncTask, sort_by, AsyncTask.created_at)
+    # 排序（以 id 作为次排序键，保证顺序稳定）
+    order_column = _SORT_COLUMNS.get(sort_by)
+    if order_column is None:
+        raise HTTPException(
+            status_code=422,  # 参数 status 覆盖了 fastapi.status 模块
+            detail=f"无效的排序字段: {sort_by}，可选值: {', '.join(_SORT_COLUMNS)}"
+        )
+    keyset = order_column is AsyncTask.created_at
     if order == "desc":
-        query = query.order_by(order_column.desc())
+        stmt = stmt.order_by(order_column.desc(), AsyncTask.id.desc())
     else:
-        query = query.order_by(order_column.asc())
+        stmt = stmt.order_by(order_column.asc(), AsyncTask.id.asc())
 
-    # 分页
-    total = query.count()
-    offset = (page - 1) * page_size
-    tasks = query.offset(offset).limit(page_size).all()
+    # 分页：有游标时走 keyset，否则回退到 OFFSET
+    total = None
+    if cursor:
+        if not keyset:
+            raise HTTPException(
+                status_code=422,  # 参数 status 覆盖了 fastapi.status 模块
+                detail="游标分页仅支持按 created_at 排序"
+            )
+        cursor_created_at, cursor_id = _decode_cursor(cursor)
+        position = tuple_(AsyncTask.created_at, AsyncTask.id)
+        if order == "desc":
+            stmt = stmt.where(position < tuple_(cursor_created_at, cursor_id))
+        else:
+            stmt = stmt.where(position > tuple_(cursor_created_at, cursor_id))
+    else:
+        if include_total:
+            stmt = stmt.add_columns(func.count().over().label("_total"))
+        stmt = stmt.offset((page - 1) * page_size)
+
+    # 多取一行用于判断是否还有下一页
+    rows = db.execute(stmt.limit(page_size + 1)).mappings().all()
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+
+    if not cursor and include_total:
+        if rows:
+            total = rows[0]["_total"]
+        elif page == 1:
+            total = 0
+        else:
+            # 页码超出范围时没有返回行，单独统计总数
+            count_stmt = select(func.count()).select_from(AsyncTask)
+            if filters:
+                count_stmt = count_stmt.where(*filters)
+            total = db.execute(count_stmt).scalar_one()
+
+    next_cursor = None
+    if keyset and has_more and rows[-1]["created_at"] is not None:
+        next_cursor = _encode_cursor(rows[-1]["created_at"], rows[-1]["id"])
 
     # 为每个任务添加 task_name
+    task_names = _generate_task_names([row["request_params"] for row in rows], db)
     result_tasks = []
-    for task in tasks:
-        task_dict = task.to_dict_with_user()
-        task_dict["task_name"] = _generate_task_name(task, db)
+    for row, task_name in zip(rows, task_names):
+        task_dict = _task_row_to_dict(row)
+        task_dict["task_name"] = task_name
         result_tasks.append(task_dict)
 
-    return TaskListResponse(
-        tasks=result_tasks,
-        total=total,
-        page=page,
-        page_size=page_size
-    )
+    return _json_response({
+        "tasks": result_tasks,
+        "total": total,
+        "page": page,
+        "page_size": page_size,
+        "next_cursor": next_cursor,
+    })
+
+
+@router.get("/stats")
+def get_task_stats(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_admin_user)
+):
+    """获取任务统计信息（管理员专用）
+
+    管理页面会频繁轮询该接口，结果在进程内缓存 _STATS_CACHE_TTL 秒；
+    任务管理器中的任务状态变化或本模块的取消/清理操作会使缓存失效。
+    """
+    now = time.monotonic()
+    version = task_manager.state_version
+    if (
+        _stats_cache["data"] is not None
+        and _stats_cache["version"] == version
+        and now < _stats_cache["expires_at"]
+    ):
+        return _stats_cache["data"]
+
+    stats = db.connection().exec_driver_sql(_STATS_SQL).fetchall()
+
+    data = {
+        "stats": {
+            AsyncTaskStatus[name].value: count for name, count in stats
+        },
+        "total": sum(count for _, count in stats)
+    }
+
+    _stats_cache["data"] = data
+    _stats_cache["version"] = version
+    _stats_cache["expires_at"] = now + _STATS_CACHE_TTL
+    return data
 
 
 @router.get("/{task_id}", response_model=TaskDetailResponse)
-async def get_task_detail(
+def get_task_detail(
     task_id: str,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_admin_user)
 ):
     """获取任务详情（管理员专用）"""
-    task = db.query(AsyncTask).filter(AsyncTask.task_id == task_id).first()
+    task = db.query(AsyncTask).options(
+        joinedload(AsyncTask.creator)
+    ).filter(AsyncTask.task_id == task_id).first()
     if not task:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -180,12 +434,12 @@ async def get_task_detail(
         )
 
     task_dict = task.to_dict_with_user()
-    task_dict["task_name"] = _generate_task_name(task, db)
+    task_dict["task_name"] = _generate_task_name(task.request_params, db)
 
-    return TaskDetailResponse(
-        task=task_dict,
-        messages=[]  # 预留：未来可以添加任务日志
-    )
+    return _json_response({
+        "task": task_dict,
+        "messages": []  # 预留：未来可以添加任务日志
+    })
 
 
 @router.post("/{task_id}/cancel")
@@ -208,30 +462,32 @@ async def cancel_task(
         db.commit()
         return {"success": True, "message": f"任务 {task_id} 已取消"}
 
-    # 如果任务不在内存中，检查数据库
-    db_task = db.query(AsyncTask).filter(
-        AsyncTask.task_id == task_id
-    ).first()
-
-    if not db_task:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"任务不存在: {task_id}"
+    # 如果任务不在内存中，直接在数据库中条件更新（一次往返，避免先查后改的竞态）
+    result = db.execute(
+        update(AsyncTask)
+        .where(
+            AsyncTask.task_id == task_id,
+            AsyncTask.status.in_(_CANCELLABLE_STATUSES)
         )
-
-    if db_task.status in [
-        AsyncTaskStatus.PENDING,
-        AsyncTaskStatus.RUNNING
-    ]:
-        db_task.status = AsyncTaskStatus.CANCELLED
-        db_task.completed_at = func.now()
+        .values(status=AsyncTaskStatus.CANCELLED, completed_at=func.now())
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount:
         db.commit()
+        _invalidate_task_stats()
         return {"success": True, "message": f"任务 {task_id} 已取消"}
-    else:
+
+    # 未更新任何行：再探测状态以区分 404 与 400（仅失败路径）
+    status_name = db.execute(_STATUS_PROBE_SQL, {"task_id": task_id}).scalar()
+    if status_name is None:
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"任务状态为 {db_task.status.value}，无法取消"
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"任务不存在: {task_id}"
         )
+    raise HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail=f"任务状态为 {AsyncTaskStatus[status_name].value}，无法取消"
+    )
 
 
 @router.post("/batch-cancel", response_model=BatchCancelResponse)
@@ -245,30 +501,35 @@ async def batch_cancel_tasks(
     取消所有处于 PENDING 或 RUNNING 状态的任务
     """
     cancelled_count = 0
+    remaining_ids = []
 
+    # 内存中的任务交给任务管理器取消，其余的统一在数据库中处理
     for task_id in request.task_ids:
-        # 检查任务是否在内存中
         task = task_manager.get_task(task_id)
-        if task and task.status in [
-            AsyncTaskStatus.PENDING,
-            AsyncTaskStatus.RUNNING
-        ]:
+        if task and task.status in _CANCELLABLE_STATUSES:
             task_manager.cancel_task(task_id)
             cancelled_count += 1
         else:
-            # 如果任务不在内存中，检查数据库
-            db_task = db.query(AsyncTask).filter(
-                AsyncTask.task_id == task_id
-            ).first()
-            if db_task and db_task.status in [
-                AsyncTaskStatus.PENDING,
-                AsyncTaskStatus.RUNNING
-            ]:
-                db_task.status = AsyncTaskStatus.CANCELLED
-                db_task.completed_at = db_task.completed_at or db.func.now()
-                cancelled_count += 1
+            remaining_ids.append(task_id)
+
+    # 一条 UPDATE 取消数据库中所有仍可取消的任务
+    if remaining_ids:
+        result = db.execute(
+            update(AsyncTask)
+            .where(
+                AsyncTask.task_id.in_(remaining_ids),
+                AsyncTask.status.in_(_CANCELLABLE_STATUSES)
+            )
+            .values(
+                status=AsyncTaskStatus.CANCELLED,
+                completed_at=func.coalesce(AsyncTask.completed_at, func.now())
+            )
+            .execution_options(synchronize_session=False)
+        )
+        cancelled_count += result.rowcount
 
     db.commit()
+    _invalidate_task_stats()
 
     return BatchCancelResponse(
         success=True,
@@ -284,22 +545,18 @@ async def cleanup_old_tasks(
 ):
     """清理已完成任务（管理员专用）
 
-    删除所有已完成、失败、取消、超时的任务
+    删除所有已完成、失败、取消、超时的任务。
+    分批删除并逐批提交，避免大表上单条 DELETE 长时间持有写锁；
+    任务日志通过外键 ON DELETE CASCADE 一并删除。
+    阻塞的删除循环放到线程池执行，不占用事件循环。
     """
-    # 删除所有终态任务
-    deleted_count = db.query(AsyncTask).filter(
-        AsyncTask.status.in_([
-            AsyncTaskStatus.COMPLETED,
-            AsyncTaskStatus.FAILED,
-            AsyncTaskStatus.CANCELLED,
-            AsyncTaskStatus.TIMEOUT
-        ])
-    ).delete()
-
-    db.commit()
+    deleted_count = await run_in_threadpool(
+        _delete_final_tasks, db, settings.task_cleanup_batch_size
+    )
 
-    # 同时清理内存中的任务
+    # 同时清理内存中的任务（任务管理器状态只在事件循环中修改）
     task_manager.cleanup_completed_tasks()
+    _invalidate_task_stats()
 
     return CleanupResponse(
         success=True,
@@ -308,36 +565,17 @@ async def cleanup_old_tasks(
     )
 
 
-@router.get("/stats")
-async def get_task_stats(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_admin_user)
-):
-    """获取任务统计信息（管理员专用）"""
-    from sqlalchemy import func
-
-    stats = db.query(
-        AsyncTask.status,
-        func.count(AsyncTask.id).label('count')
-    ).group_by(AsyncTask.status).all()
-
-    return {
-        "stats": {
-            status.value: count for status, count in stats
-        },
-        "total": sum(count for _, count in stats)
-    }
-
-
 @router.get("/{task_id}/logs", response_model=TaskLogResponse)
-async def get_task_logs(
+def get_task_logs(
     task_id: str,
+    page: int = Query(1, ge=1, description="页码"),
+    page_size: int = Query(500, ge=1, le=1000, description="每页数量"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_admin_user)
 ):
     """获取任务日志（管理员专用）
 
-    返回指定任务的所有日志记录，按时间倒序排列
+    分页返回指定任务的日志记录，按时间倒序排列；total 为该任务的日志总数
     """
     # 检查任务是否存在
     task = db.query(AsyncTask).filter(AsyncTask.task_id == task_id).first()
@@ -347,19 +585,29 @@ async def get_task_logs(
             detail=f"任务不存在: {task_id}"
         )
 
-    # 获取日志
+    # 获取当前页日志
     logs = db.query(AsyncTaskLog).filter(
         AsyncTaskLog.task_id == task_id
-    ).order_by(AsyncTaskLog.id.desc()).all()
+    ).order_by(
+        AsyncTaskLog.timestamp.desc(), AsyncTaskLog.id.desc()
+    ).offset((page - 1) * page_size).limit(page_size).all()
 
-    return TaskLogResponse(
-        logs=[log.to_dict() for log in logs],
-        total=len(logs)
-    )
+    # 日志总数（首页未取满时无需额外查询）
+    if page == 1 and len(logs) < page_size:
+        total = len(logs)
+    else:
+        total = db.query(func.count(AsyncTaskLog.id)).filter(
+            AsyncTaskLog.task_id == task_id
+        ).scalar()
+
+    return _json_response({
+        "logs": [log.to_dict() for log in logs],
+        "total": total
+    })
 
 
 @router.get("/{task_id}/result")
-async def get_task_result(
+def get_task_result(
     task_id: str,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_admin_user)
@@ -385,8 +633,8 @@ async def get_task_result(
             detail=f"任务未完成，当前状态: {task.status.value}"
         )
 
-    return {
+    return _json_response({
         "task_id": task.task_id,
         "result": task.result,
-        "completed_at": task.completed_at.isoformat() if task.completed_at else None
-    }
+        "completed_at": task.completed_at
+    })
@@ -19,6 +19,9 @@ class Settings(BaseSettings):
         default="sqlite:///./autotestcase.db",
         description="数据库连接URL"
     )
+    db_pool_size: int = 20  # 连接池常驻连接数
+    db_max_overflow: int = 40  # 连接池允许的额外连接数
+    db_pool_recycle: int = 1800  # 连接回收时间（秒）
     
     # JWT认证配置
     secret_key: str = Field(
@@ -61,6 +64,17 @@ class Settings(BaseSettings):
         description="Anthropic API基础URL"
     )
     
+    # 异步任务配置
+    task_cleanup_batch_size: int = Field(
+        default=1000,
+        gt=0,
+        description="清理已完成任务时每批删除的行数"
+    )
+    task_memory_high_mb: int = 512  # 进程常驻内存超过该值（MB）时清理内存中的已完成任务
+    task_memory_low_mb: int = 256  # 进程常驻内存低于该值（MB）时降低内存检查频率
+    task_log_flush_threshold: int = 10  # 任务日志缓冲区达到该条数时立即刷新
+    task_log_level: str = "info"  # 任务日志写入数据库的最低级别（debug/info/warning/error）
+    
     # CORS配置
     cors_origins: list = [
         "http://localhost:3000",
@@ -0,0 +1,52 @@
+"""
+日志配置：QueueHandler + QueueListener
+
+业务代码（包括事件循环中的协程）只把日志记录放入内存队列，
+实际的格式化和 stdout / 文件写入由 QueueListener 的后台线程完成，
+避免终端或磁盘 I/O 阻塞事件循环。
+"""
+import logging
+import logging.handlers
+import queue
+from typing import Optional
+
+from app.config import settings
+
+_LOG_FORMAT = "%(asctime)s %(levelname)s [%(name)s] %(message)s"
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional[logging.handlers.QueueHandler] = None
+
+
+def setup_logging() -> None:
+    """配置根日志器（幂等，重复调用不会重复添加处理器）"""
+    global _listener, _queue_handler
+    if _listener is not None:
+        return
+
+    formatter = logging.Formatter(_LOG_FORMAT)
+    handlers = [logging.StreamHandler()]
+    if settings.log_file:
+        handlers.append(logging.FileHandler(settings.log_file, encoding="utf-8"))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue: queue.Queue = queue.Queue(-1)
+    root = logging.getLogger()
+    _queue_handler = logging.handlers.QueueHandler(log_queue)
+    root.addHandler(_queue_handler)
+    root.setLevel(settings.log_level.upper())
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown_logging() -> None:
+    """停止后台日志线程，并写出队列中剩余的日志"""
+    global _listener, _queue_handler
+    if _queue_handler is not None:
+        logging.getLogger().removeHandler(_queue_handler)
+        _queue_handler = None
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -6,6 +6,7 @@ from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 
 from app.config import settings, get_settings
+from app.core.logging_setup import setup_logging, shutdown_logging
 from app.database import create_tables, SessionLocal
 from app.services.settings_service import SettingsService
 from app.services.async_task_manager import task_manager
@@ -14,6 +15,9 @@ from app.services.async_task_manager import task_manager
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """应用生命周期管理"""
+    # 日志经队列交给后台线程输出，避免 I/O 阻塞事件循环
+    setup_logging()
+
     # 启动时创建数据库表
     create_tables()
     print("🚀 数据库表创建完成")
@@ -46,12 +50,16 @@ async def lifespan(app: FastAPI):
         print(f"⚠️ 初始化警告: {e}")
     finally:
         db.close()
-    
+
+    # 启动任务管理器的数据库写入工作线程
+    await task_manager.start()
+
     yield
     # 关闭时的清理工作
     print("👋 应用关闭中...")
     await task_manager.shutdown()
     print("👋 应用关闭完成")
+    shutdown_logging()
 
 
 # 创建FastAPI应用实例
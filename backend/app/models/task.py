@@ -5,11 +5,12 @@
 from typing import Optional, Dict, Any, List
 from datetime import datetime
 from enum import Enum
-from sqlalchemy import Column, Integer, String, DateTime, Text, Enum as SQLEnum, Index, ForeignKey, JSON
-from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy.sql import func
+from sqlalchemy import Column, Integer, String, DateTime, Text, Enum as SQLEnum, Index, ForeignKey, insert
+from sqlalchemy.orm import Mapped, mapped_column, relationship, Session
+from sqlalchemy.sql import func, text
 
 from app.database import Base
+from app.models.types import FastJSON
 
 
 class AsyncTaskStatus(str, Enum):
@@ -53,7 +54,7 @@ class AsyncTaskLog(Base):
 
     # 日志内容
     level: Mapped[TaskLogLevel] = mapped_column(
-        SQLEnum(TaskLogLevel),
+        SQLEnum(TaskLogLevel, native_enum=False, create_constraint=False, length=20),
         default=TaskLogLevel.INFO
     )
     message: Mapped[str] = mapped_column(Text, nullable=False)
@@ -89,12 +90,17 @@ class AsyncTaskLog(Base):
     # 关系
     task: Mapped["AsyncTask"] = relationship("AsyncTask", back_populates="logs")
 
+    # 索引优化：按任务查询日志并按时间倒序（反向扫描索引，无需额外排序）
+    __table_args__ = (
+        Index('idx_async_task_logs_task_time', 'task_id', 'timestamp'),
+    )
+
     def to_dict(self) -> Dict[str, Any]:
         """转换为字典格式（包含扩展字段）"""
         return {
             "id": self.id,
             "task_id": self.task_id,
-            "level": self.level.value if isinstance(self.level, Enum) else self.level,
+            "level": self.level.value if self.level is not None else None,
             "message": self.message,
             "timestamp": self.timestamp.isoformat() if self.timestamp else None,
             # 扩展字段
@@ -111,6 +117,17 @@ class AsyncTaskLog(Base):
             "total_batches": self.total_batches,
         }
 
+    @classmethod
+    def bulk_insert(cls, session: Session, rows: List[Dict[str, Any]]) -> None:
+        """批量插入日志（Core INSERT，跳过 ORM 工作单元）
+
+        Args:
+            session: 数据库会话
+            rows: 日志字段字典列表，所有字典需包含相同的键
+        """
+        if rows:
+            session.execute(insert(cls), rows)
+
     def __repr__(self) -> str:
         return f"<AsyncTaskLog(id={self.id}, task_id={self.task_id}, level={self.level})>"
 
@@ -126,8 +143,10 @@ class AsyncTask(Base):
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     task_id: Mapped[str] = mapped_column(String(100), unique=True, nullable=False, index=True)
     task_type: Mapped[str] = mapped_column(String(50), nullable=False, index=True)
+    # 状态更新频繁：以普通 VARCHAR 存储，不使用数据库原生 ENUM 类型或 CHECK 约束，
+    # 取值校验由 AsyncTaskStatus 枚举在应用层完成
     status: Mapped[AsyncTaskStatus] = mapped_column(
-        SQLEnum(AsyncTaskStatus),
+        SQLEnum(AsyncTaskStatus, native_enum=False, create_constraint=False, length=20),
         default=AsyncTaskStatus.PENDING,
         index=True
     )
@@ -139,22 +158,24 @@ class AsyncTask(Base):
     message: Mapped[Optional[str]] = mapped_column(Text, nullable=True)  # 进度消息
 
     # 结果数据（JSON格式存储）
-    result: Mapped[Optional[Dict[str, Any]]] = mapped_column(JSON, nullable=True)
+    result: Mapped[Optional[Dict[str, Any]]] = mapped_column(FastJSON, nullable=True)
     error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
 
     # 原始请求参数（用于重试）
-    request_params: Mapped[Optional[Dict[str, Any]]] = mapped_column(JSON, nullable=True, comment="原始请求参数，用于重试")
+    request_params: Mapped[Optional[Dict[str, Any]]] = mapped_column(FastJSON, nullable=True, comment="原始请求参数，用于重试")
 
     # 用户关联
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False, index=True)
     creator: Mapped["User"] = relationship("User")
 
-    # 日志关联
+    # 日志关联：不设默认排序，禁止隐式懒加载；需要时显式 selectinload 或单独分页查询
+    # 删除任务时由数据库外键 ON DELETE CASCADE 清理日志，ORM 不再加载子行
     logs: Mapped[List["AsyncTaskLog"]] = relationship(
         "AsyncTaskLog",
         back_populates="task",
         cascade="all, delete-orphan",
-        order_by="AsyncTaskLog.id.desc()"
+        passive_deletes=True,
+        lazy="raise"
     )
 
     # 时间戳
@@ -170,6 +191,10 @@ class AsyncTask(Base):
     __table_args__ = (
         Index('idx_async_tasks_status_created', 'status', 'created_at'),
         Index('idx_async_tasks_user_status', 'user_id', 'status'),
+        # 任务列表按类型+状态过滤并按创建时间倒序，可直接走索引范围扫描
+        Index('idx_async_tasks_type_status_created', 'task_type', 'status', text('created_at DESC')),
+        # 按用户过滤的任务列表
+        Index('idx_async_tasks_user_created', 'user_id', 'created_at'),
     )
 
     def to_dict(self) -> Dict[str, Any]:
@@ -178,7 +203,7 @@ class AsyncTask(Base):
             "id": self.id,
             "task_id": self.task_id,
             "task_type": self.task_type,
-            "status": self.status.value if isinstance(self.status, Enum) else self.status,
+            "status": self.status.value if self.status is not None else None,
             "progress": self.progress,
             "total_batches": self.total_batches,
             "completed_batches": self.completed_batches,
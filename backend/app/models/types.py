@@ -0,0 +1,39 @@
+"""
+自定义列类型
+"""
+from typing import Any, Optional
+
+from sqlalchemy import Text
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.types import TypeDecorator
+
+from app.database import json_dumps, json_loads
+
+
+class FastJSON(TypeDecorator):
+    """基于 orjson 的 JSON 列类型
+
+    - PostgreSQL: 使用二进制 JSONB 存储
+    - 其他数据库（SQLite 等）: 以紧凑 JSON 文本存储在 TEXT 列中，
+      读写均使用 orjson 序列化，比标准库 json 更快；orjson 无法处理的值
+      （如超出 64 位的整数）退回标准库 json，见 app.database.json_dumps / json_loads
+
+    与原 JSON 列存储格式兼容，已有数据无需迁移。
+    """
+    impl = Text
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == "postgresql":
+            return dialect.type_descriptor(JSONB())
+        return dialect.type_descriptor(Text())
+
+    def process_bind_param(self, value: Any, dialect) -> Optional[Any]:
+        if value is None or dialect.name == "postgresql":
+            return value
+        return json_dumps(value)
+
+    def process_result_value(self, value: Any, dialect) -> Optional[Any]:
+        if value is None or dialect.name == "postgresql":
+            return value
+        return json_loads(value) if value else None
@@ -5,15 +5,52 @@
 支持数据库持久化任务状态
 """
 import asyncio
+import logging
+import os
+import random
+import time
 import uuid
-from typing import Dict, Any, Optional, List, Callable, TYPE_CHECKING
+from collections import deque, OrderedDict
+from typing import Dict, Any, Optional, List, Deque, Sequence, Callable, TYPE_CHECKING
 from datetime import datetime
 from enum import Enum
 from dataclasses import dataclass, field
 
+from app.config import settings
+from app.models.task import TaskLogLevel
+
 if TYPE_CHECKING:
     from sqlalchemy.orm import Session
 
+logger = logging.getLogger(__name__)
+
+# 高频的任务开始 / 完成 / 失败日志模板，交给 logging 惰性格式化
+_TASK_STARTED_FMT = "▶ 任务 %s... 开始执行 | 类型: %s"
+_TASK_DONE_FMT = "✅ 任务 %s... 执行完成 | 类型: %s | 耗时: %.2f秒"
+_TASK_DONE_NO_DURATION_FMT = "✅ 任务 %s... 执行完成 | 类型: %s"
+_TASK_FAILED_FMT = "❌ 任务 %s... 执行失败 | 类型: %s | 耗时: %.2f秒 | 错误: %s"
+_TASK_FAILED_NO_DURATION_FMT = "❌ 任务 %s... 执行失败 | 类型: %s | 错误: %s"
+
+
+def _current_rss_bytes() -> Optional[int]:
+    """获取当前进程的常驻内存（字节）
+
+    读取 /proc/self/statm 得到当前值（Linux）；其他平台返回 None。
+    不退回 getrusage：ru_maxrss 是峰值，不会随内存释放而下降，无法反映当前内存压力。
+    """
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+# 日志级别数值（用于级别过滤）
+_LEVEL_NUM: Dict[str, int] = {"debug": 0, "info": 1, "warning": 2, "error": 3}
+
+# 日志级别字符串到枚举的查找表（避免每行日志重复构造/扫描枚举）
+_LOG_LEVELS: Dict[str, TaskLogLevel] = {e.value: e for e in TaskLogLevel}
+
 
 class AsyncTaskStatus(str, Enum):
     """异步任务状态"""
@@ -25,6 +62,49 @@ class AsyncTaskStatus(str, Enum):
     TIMEOUT = "timeout"
 
 
+# 终态任务状态
+_TERMINAL_STATUSES = frozenset({
+    AsyncTaskStatus.COMPLETED,
+    AsyncTaskStatus.FAILED,
+    AsyncTaskStatus.CANCELLED,
+    AsyncTaskStatus.TIMEOUT,
+})
+
+
+# 需要同步到数据库的任务字段
+_SYNC_FIELDS = (
+    "status",
+    "progress",
+    "total_batches",
+    "completed_batches",
+    "message",
+    "result",
+    "error",
+    "started_at",
+    "completed_at",
+    "request_params",
+)
+
+
+# 以 epoch 秒存储的时间字段
+_TIMESTAMP_FIELDS = frozenset({"created_at", "started_at", "completed_at"})
+
+
+def _from_epoch(ts: Optional[float]) -> Optional[datetime]:
+    """epoch 秒转换为 naive UTC datetime（与数据库中的时间格式一致）"""
+    return datetime.utcfromtimestamp(ts) if ts is not None else None
+
+
+class _ProgCache:
+    """单个任务的进度节流状态（原地修改，避免每次更新重新构造字典）"""
+    __slots__ = ("last_progress", "last_update_time", "pending_message")
+
+    def __init__(self) -> None:
+        self.last_progress: int = -1
+        self.last_update_time: float = 0.0  # time.monotonic() 时间
+        self.pending_message: Optional[str] = None
+
+
 @dataclass
 class AsyncTask:
     """异步任务数据类"""
@@ -39,10 +119,17 @@ class AsyncTask:
     message: Optional[str] = None  # 进度消息
     request_params: Optional[Dict[str, Any]] = None  # 原始请求参数，用于重试
     user_id: Optional[int] = None  # 用户 ID
-    created_at: datetime = field(default_factory=datetime.utcnow)
-    started_at: Optional[datetime] = None
-    completed_at: Optional[datetime] = None
-    
+    # 时间戳以 UTC epoch 秒存储，仅在序列化/写入数据库时转换为 datetime
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    completed_at: Optional[float] = None
+    # 自上次写入数据库以来修改过的持久化字段
+    _dirty: set = field(default_factory=set, repr=False, compare=False)
+
+    def mark_dirty(self, *fields: str) -> None:
+        """标记需要同步到数据库的字段"""
+        self._dirty.update(fields)
+
     def to_dict(self) -> Dict[str, Any]:
         return {
             "task_id": self.task_id,
@@ -54,9 +141,9 @@ class AsyncTask:
             "result": self.result,
             "error": self.error,
             "message": self.message,
-            "created_at": self.created_at.isoformat() if self.created_at else None,
-            "started_at": self.started_at.isoformat() if self.started_at else None,
-            "completed_at": self.completed_at.isoformat() if self.completed_at else None,
+            "created_at": _from_epoch(self.created_at).isoformat() if self.created_at else None,
+            "started_at": _from_epoch(self.started_at).isoformat() if self.started_at else None,
+            "completed_at": _from_epoch(self.completed_at).isoformat() if self.completed_at else None,
         }
 
 
@@ -68,6 +155,10 @@ class AsyncTaskManager:
     - task_timeout: 任务超时时间（秒）
     - retry_count: 失败重试次数
     - queue_size: 任务队列大小
+
+    数据库写入由 _db_worker 作为唯一写入者串行执行（缓冲日志也经写入队列交给它）；
+    关闭时的直接写入为同步 DB 调用，中间没有 await，在单线程事件循环中不会与
+    _db_worker 交错，因此无需额外的写入锁。
     """
 
     # 默认配置值
@@ -77,21 +168,48 @@ class AsyncTaskManager:
     DEFAULT_QUEUE_SIZE = 100
     DEFAULT_LOG_LEVEL = "info"  # 默认日志级别
 
+    # 内存中最多保留的任务数，超出后淘汰最久未访问的终态任务（历史记录以数据库为准）
+    MAX_IN_MEMORY_TASKS = 10000
+
     # 批量日志配置
-    _LOG_BATCH_SIZE = 10  # 批量写入大小
+    _LOG_BATCH_SIZE = 10  # 批量写入大小（默认的立即刷新阈值）
     _LOG_FLUSH_INTERVAL = 2.0  # 刷新间隔（秒）
 
+    # 数据库写入合并：每轮最多从队列取出的写入请求数
+    _DB_BATCH_MAX = 200
+    # 写入队列中表示“一批缓冲日志”的键
+    _LOG_BATCH_ITEM = "__log_batch__"
+    # 写入队列中表示“任务终态 + 日志”的键，由同一个事务写入
+    _FINALIZE_ITEM = "__finalize__"
+    # 进度类变更不单独入队，只标记为脏任务，由写入工作线程最迟每隔该时间（秒）合并写入一次
+    _DIRTY_FLUSH_INTERVAL = 0.5
+    # 单个任务同步到数据库连续失败达到该次数后放弃写入，避免坏数据无限重试
+    _SYNC_MAX_ATTEMPTS = 5
+
+    # 内存检查间隔（秒）：内存偏高时每分钟检查，偏低时每 5 分钟检查
+    _MEMORY_CHECK_INTERVAL_HIGH = 60
+    _MEMORY_CHECK_INTERVAL_LOW = 300
+    # 内存偏高时只淘汰结束超过该时间（秒）的终态任务，刚结束的任务保留给轮询中的客户端
+    _MEMORY_EVICT_MIN_AGE = 300
+
     # 进度更新节流配置
     _PROGRESS_UPDATE_THRESHOLD = 5  # 进度变化阈值（百分比）
     _PROGRESS_UPDATE_INTERVAL = 3.0  # 时间间隔（秒）
 
-    # 类级别的数据库写入锁，确保所有数据库操作串行化
-    _db_write_lock = asyncio.Lock()
-
     def __init__(self):
-        self._tasks: Dict[str, AsyncTask] = {}
+        # 按最近使用排序：终态转换和状态查询会将任务移到末尾
+        self._tasks: "OrderedDict[str, AsyncTask]" = OrderedDict()
+        self._max_cached_tasks: int = self.MAX_IN_MEMORY_TASKS  # 内存任务数上限
         self._running_tasks: Dict[str, asyncio.Task] = {}
-        self._pending_queue: List[str] = []  # 等待执行的任务队列
+        # 等待执行的任务队列，配合入队序号索引实现 O(1) 的成员判断和队列位置查询
+        self._pending_queue: Deque[str] = deque()
+        self._queue_positions: Dict[str, int] = {}  # task_id -> 入队序号
+        self._queue_head_seq: int = 0  # 队首任务的入队序号
+        # 已从队列中间移除、尚未出队的条目（墓碑，记录入队序号），到达队首时丢弃。
+        # 按序号而非 task_id 记录：同一任务重新入队后再次移除时，新旧墓碑互不覆盖
+        self._cancelled_pending: set = set()
+        # 排队任务的准入信号：execute_with_timeout 在此等待，出队启动时唤醒
+        self._admission_waiters: Dict[str, asyncio.Future] = {}
 
         # 并发配置（从系统设置加载）
         self._max_concurrent_tasks: int = self.DEFAULT_MAX_CONCURRENT_TASKS
@@ -99,9 +217,12 @@ class AsyncTaskManager:
         self._retry_count: int = self.DEFAULT_RETRY_COUNT
         self._queue_size: int = self.DEFAULT_QUEUE_SIZE
         self._log_level: str = self.DEFAULT_LOG_LEVEL  # 日志级别
+        self._log_level_num: int = _LEVEL_NUM[self.DEFAULT_LOG_LEVEL]  # 日志级别数值，由 set_log_level 维护
+        self.set_log_level(settings.task_log_level)  # 低于该级别的任务日志不写入数据库
 
-        # 配置是否已加载
+        # 配置是否已加载（已加载后 load_config_from_db 直接返回，reload_config 使其失效）
         self._config_loaded: bool = False
+        self._config_load_lock = asyncio.Lock()  # 异步加载单飞锁：并发请求只触发一次查询
 
         # 数据库会话（用于持久化）
         self._db: Optional["Session"] = None
@@ -116,17 +237,68 @@ class AsyncTaskManager:
         self._shutdown_event = asyncio.Event()  # 关闭信号
 
         # 日志缓冲区（批量写入优化）
-        self._log_buffer: List[tuple] = []  # (task_id, log_data) 列表
-        self._log_buffer_lock = asyncio.Lock()  # 保护缓冲区
+        # (task_id, log_data) 队列；事件循环单线程执行，追加和整体替换均无需加锁
+        self._log_buffer: Deque[tuple] = deque()
         self._log_flush_task: Optional[asyncio.Task] = None  # 定时刷新任务
+        self._memory_monitor_task: Optional[asyncio.Task] = None  # 内存压力监控任务
+        self._log_flush_event = asyncio.Event()  # 缓冲区满时唤醒刷新任务
+        # 缓冲区达到该条数时立即刷新，限制单次刷新的规模和日志延迟
+        self._log_flush_threshold: int = max(1, settings.task_log_flush_threshold or self._LOG_BATCH_SIZE)
+        # 定时写入间隔按实例随机偏移 ±5%，多进程部署时各进程的定时写入不会同时落到数据库
+        self._log_flush_interval: float = self._LOG_FLUSH_INTERVAL * random.uniform(0.95, 1.05)
+        self._dirty_flush_interval: float = self._DIRTY_FLUSH_INTERVAL * random.uniform(0.95, 1.05)
         self._last_flush_time: float = 0  # 上次刷新时间
 
         # 进度更新缓存（节流优化）
-        self._progress_cache: Dict[str, Dict] = {}  # {task_id: {last_progress, last_update_time, pending_message}}
+        self._progress_cache: Dict[str, _ProgCache] = {}
+
+        # 数据库主键缓存（task_id -> async_tasks.id）：task_id 不可变且写入由 _db_worker 独占，
+        # 插入后记住主键，后续 UPDATE 直接按主键定位，无需先 SELECT
+        self._db_pk_cache: Dict[str, int] = {}
+
+        # 待写入的进度变更（task_id 集合），由 _db_worker 随下一批写入或定时合并写入
+        self._dirty_tasks: set = set()
+        # 同步失败待重试的任务（task_id -> 连续失败次数）
+        self._sync_failures: Dict[str, int] = {}
+
+        # 任务状态版本号（任务创建或状态变化时递增，用于使统计缓存失效）
+        self._state_version: int = 0
+
+        # 按状态分组的任务 ID 索引（由 _set_task_status 维护），
+        # 运行中任务计数和已完成任务清理无需扫描 _tasks
+        self._tasks_by_status: Dict[AsyncTaskStatus, set] = {status: set() for status in AsyncTaskStatus}
     
     def load_config_from_db(self, db: "Session") -> None:
         """从数据库加载并发配置
 
+        配置已加载时直接返回；系统设置更新后由 reload_config 强制重新加载。
+
+        Args:
+            db: 数据库会话
+        """
+        if self._config_loaded:
+            return
+        self._load_config(db)
+
+    async def load_config_from_db_async(self, db: "Session") -> None:
+        """从数据库加载并发配置（异步版本，用于请求处理协程）
+
+        查询在线程池中执行，不阻塞事件循环；并发调用在锁上等待同一次加载的结果，
+        锁内再次检查加载标记，保证只有一个调用真正查询数据库。
+
+        Args:
+            db: 数据库会话
+        """
+        if self._config_loaded:
+            return
+        async with self._config_load_lock:
+            if self._config_loaded:
+                return
+            await asyncio.to_thread(self._load_config, db)
+
+    def _load_config(self, db: "Session") -> None:
+        """查询系统设置并应用并发配置
+
         Args:
             db: 数据库会话
         """
@@ -141,13 +313,12 @@ class AsyncTaskManager:
             self._queue_size = config.queue_size
             self._config_loaded = True
 
-            print(f"[AsyncTaskManager] 已加载并发配置: "
-                  f"max_concurrent_tasks={self._max_concurrent_tasks}, "
-                  f"http_timeout={config.http_timeout}s, "
-                  f"retry_count={self._retry_count}, "
-                  f"queue_size={self._queue_size}")
+            logger.info("已加载并发配置: max_concurrent_tasks=%s, http_timeout=%ss, "
+                        "retry_count=%s, queue_size=%s",
+                        self._max_concurrent_tasks, config.http_timeout,
+                        self._retry_count, self._queue_size)
         except Exception as e:
-            print(f"[AsyncTaskManager] 加载并发配置失败，使用默认值: {e}")
+            logger.warning("加载并发配置失败，使用默认值: %s", e)
             self._config_loaded = False
     
     def reload_config(self, db: "Session") -> None:
@@ -158,6 +329,7 @@ class AsyncTaskManager:
         Args:
             db: 数据库会话
         """
+        self._config_loaded = False
         self.load_config_from_db(db)
 
     @property
@@ -180,6 +352,11 @@ class AsyncTaskManager:
         """配置是否已从数据库加载"""
         return self._config_loaded
 
+    @property
+    def state_version(self) -> int:
+        """任务状态版本号（任务创建或状态变化时递增）"""
+        return self._state_version
+
     def set_db_session(self, db: Optional["Session"]) -> None:
         """设置数据库会话（用于持久化）
 
@@ -195,10 +372,10 @@ class AsyncTaskManager:
             task_id: 任务 ID
             user_id: 用户 ID
         """
-        self._task_user_ids[task_id] = user_id
-        # 同时设置到任务对象中
+        # 同时设置到任务对象中；未知任务不记录，避免缓存无限增长
         task = self.get_task(task_id)
         if task:
+            self._task_user_ids[task_id] = user_id
             task.user_id = user_id
             # 同步到数据库
             self._sync_to_db(task_id, task)
@@ -213,16 +390,48 @@ class AsyncTaskManager:
         task = self.get_task(task_id)
         if task:
             task.request_params = params
+            task.mark_dirty("request_params")
             # 同步到数据库
             self._sync_to_db(task_id, task)
 
+    async def start(self) -> None:
+        """启动后台数据库写入工作线程、日志刷新任务和内存监控任务（应用启动时调用）"""
+        await self._start_db_worker()
+        if _current_rss_bytes() is None:
+            # 无法获取当前常驻内存的平台不启用内存监控，只靠 _max_cached_tasks 限制内存任务数
+            logger.info("无法获取进程当前内存占用，内存监控未启用")
+        elif self._memory_monitor_task is None or self._memory_monitor_task.done():
+            self._memory_monitor_task = asyncio.create_task(self._memory_monitor_loop())
+
+    async def _memory_monitor_loop(self) -> None:
+        """按内存压力自适应地清理内存中的已完成任务
+
+        常驻内存超过 task_memory_high_mb 时，淘汰所有结束超过 _MEMORY_EVICT_MIN_AGE 秒的
+        终态任务（刚结束的任务保留给轮询中的客户端），并缩短检查间隔；
+        低于 task_memory_low_mb 时恢复为较长的检查间隔。
+        """
+        interval = self._MEMORY_CHECK_INTERVAL_LOW
+        while not self._shutdown_event.is_set():
+            await asyncio.sleep(interval)
+            try:
+                rss_mb = (_current_rss_bytes() or 0) / (1024 * 1024)
+                if rss_mb > settings.task_memory_high_mb:
+                    removed = self._evict_finished_tasks(limit=0, min_age=self._MEMORY_EVICT_MIN_AGE)
+                    if removed:
+                        logger.info("内存占用 %.0fMB 超过阈值，淘汰已完成任务 %d 个", rss_mb, removed)
+                    interval = self._MEMORY_CHECK_INTERVAL_HIGH
+                elif rss_mb < settings.task_memory_low_mb:
+                    interval = self._MEMORY_CHECK_INTERVAL_LOW
+            except Exception as e:
+                logger.error("内存监控错误: %s", e)
+
     async def _start_db_worker(self) -> None:
         """启动数据库写入工作线程（如果未启动）"""
         async with self._db_worker_lock:
             if self._db_worker_task is None or self._db_worker_task.done():
                 self._shutdown_event.clear()
                 self._db_worker_task = asyncio.create_task(self._db_worker())
-                print("[AsyncTaskManager] 数据库写入工作线程已启动")
+                logger.info("数据库写入工作线程已启动")
 
         # 启动日志刷新任务
         await self._start_log_flusher()
@@ -235,15 +444,22 @@ class AsyncTaskManager:
         async def flush_loop():
             while not self._shutdown_event.is_set():
                 try:
-                    await asyncio.sleep(self._LOG_FLUSH_INTERVAL)
+                    # 缓冲区达到批量大小时立即唤醒，否则最多等待约 _LOG_FLUSH_INTERVAL 秒
+                    # asyncio.timeout 只在事件循环上登记一个定时回调，不像 wait_for 那样额外包装 Task
+                    try:
+                        async with asyncio.timeout(self._log_flush_interval):
+                            await self._log_flush_event.wait()
+                    except TimeoutError:
+                        pass
+                    self._log_flush_event.clear()
                     await self._flush_log_buffer()
                 except asyncio.CancelledError:
                     break
                 except Exception as e:
-                    print(f"[AsyncTaskManager] 日志刷新错误: {e}")
+                    logger.error("日志刷新错误: %s", e)
 
         self._log_flush_task = asyncio.create_task(flush_loop())
-        print("[AsyncTaskManager] 日志刷新任务已启动")
+        logger.info("日志刷新任务已启动")
 
     async def _stop_db_worker(self) -> None:
         """停止数据库写入工作线程"""
@@ -261,7 +477,7 @@ class AsyncTaskManager:
                 try:
                     await asyncio.wait_for(self._db_worker_task, timeout=5.0)
                 except asyncio.TimeoutError:
-                    print("[AsyncTaskManager] 等待数据库写入工作线程退出超时")
+                    logger.warning("等待数据库写入工作线程退出超时")
                     self._db_worker_task.cancel()
                     try:
                         await self._db_worker_task
@@ -279,113 +495,363 @@ class AsyncTaskManager:
                 await self._log_flush_task
             except asyncio.CancelledError:
                 pass
-            print("[AsyncTaskManager] 日志刷新任务已停止")
+            logger.info("日志刷新任务已停止")
 
     async def _db_worker(self) -> None:
         """后台数据库写入工作线程
 
-        串行处理所有数据库写入请求，避免并发写入冲突
+        串行处理所有数据库写入请求，避免并发写入冲突。
+        每次取到一项后非阻塞地取空队列（最多 _DB_BATCH_MAX 项），
+        同一任务的多次状态同步只保留最新一次，日志合并为一次批量写入。
+        标记为脏的任务（进度更新）随每批一起写入；日志缓冲区只在队列已取空时并入本批，
+        保证缓冲日志依赖的任务记录不会还排在队列中（否则外键失败）。
+        队列空闲时最迟每 _DIRTY_FLUSH_INTERVAL 秒写入一次脏任务。
+        工作线程是唯一写入者，整个生命周期复用同一个会话，每批提交一次。
         """
-        print("[AsyncTaskManager] 数据库写入工作线程开始运行")
-        while not self._shutdown_event.is_set():
-            try:
-                # 等待队列中的任务，设置超时以便检查关闭信号
-                task_id, data = await asyncio.wait_for(
-                    self._db_queue.get(),
-                    timeout=1.0
-                )
-
-                # 退出信号
-                if task_id is None:
-                    print("[AsyncTaskManager] 数据库写入工作线程收到退出信号")
+        from app.database import SessionLocal
+
+        logger.info("数据库写入工作线程开始运行")
+        db = SessionLocal()
+        try:
+            while not self._shutdown_event.is_set():
+                try:
+                    pending_tasks: Dict[str, AsyncTask] = {}
+                    pending_logs: List[tuple] = []
+
+                    # 等待队列中的任务，设置超时以便检查关闭信号和写入脏任务
+                    try:
+                        async with asyncio.timeout(self._dirty_flush_interval):
+                            item = await self._db_queue.get()
+                    except TimeoutError:
+                        if not self._dirty_tasks:
+                            continue
+                        stop = False
+                    else:
+                        stop = self._collect_db_item(item, pending_tasks, pending_logs)
+
+                    # 取空队列中已积压的写入请求
+                    drained = False
+                    while not stop and len(pending_tasks) + len(pending_logs) < self._DB_BATCH_MAX:
+                        try:
+                            item = self._db_queue.get_nowait()
+                        except asyncio.QueueEmpty:
+                            drained = True
+                            break
+                        stop = self._collect_db_item(item, pending_tasks, pending_logs)
+                    self._collect_dirty_tasks(pending_tasks)
+                    # 队列未取空时，缓冲日志留给后续批次（或由日志刷新任务排到队尾）
+                    if drained:
+                        self._collect_buffered_logs(pending_logs)
+
+                    await self._do_write_batch(db, pending_tasks, pending_logs)
+
+                    # 退出信号
+                    if stop:
+                        logger.info("数据库写入工作线程收到退出信号")
+                        break
+
+                except asyncio.CancelledError:
+                    logger.info("数据库写入工作线程被取消")
                     break
+                except Exception as e:
+                    logger.error("数据库写入工作线程错误: %s", e)
+                    # 丢弃可能已损坏的会话，重新创建
+                    db.rollback()
+                    db.close()
+                    db = SessionLocal()
+
+            # 退出前写完队列中剩余的请求（如关闭时刷新的缓冲日志）
+            pending_tasks = {}
+            pending_logs = []
+            while True:
+                try:
+                    self._collect_db_item(self._db_queue.get_nowait(), pending_tasks, pending_logs)
+                except asyncio.QueueEmpty:
+                    break
+            self._collect_dirty_tasks(pending_tasks)
+            self._collect_buffered_logs(pending_logs)
+            await self._do_write_batch(db, pending_tasks, pending_logs)
+        finally:
+            db.close()
 
-                # 判断数据类型：AsyncTask 对象或日志数据字典
-                if isinstance(data, dict) and data.get("type") == "log":
-                    # 处理日志添加
-                    await self._do_add_log(task_id, data)
-                elif isinstance(data, AsyncTask):
-                    # 处理任务状态同步
-                    await self._do_sync_to_db(task_id, data)
-                else:
-                    print(f"[AsyncTaskManager] 警告: 未知的队列数据类型: {type(data)}")
+        logger.info("数据库写入工作线程已结束")
 
-            except asyncio.TimeoutError:
-                # 超时检查关闭信号
-                continue
-            except asyncio.CancelledError:
-                print("[AsyncTaskManager] 数据库写入工作线程被取消")
-                break
-            except Exception as e:
-                print(f"[AsyncTaskManager] 数据库写入工作线程错误: {e}")
+    def _collect_dirty_tasks(self, pending_tasks: Dict[str, AsyncTask]) -> None:
+        """取出全部脏任务并入本批写入（已在批次中的任务不重复添加）"""
+        if not self._dirty_tasks:
+            return
+        dirty, self._dirty_tasks = self._dirty_tasks, set()
+        for task_id in dirty:
+            task = self._tasks.get(task_id)
+            if task is not None and task_id not in pending_tasks:
+                pending_tasks[task_id] = task
+
+    def _collect_buffered_logs(self, pending_logs: List[tuple]) -> None:
+        """取出日志缓冲区并入本批写入
+
+        工作线程取空队列后顺带写出缓冲日志，与本批任务状态在同一个事务中提交，
+        不必等待日志刷新任务的下一个周期。调用方须保证队列已取空。
+        """
+        if self._log_buffer:
+            log_batch, self._log_buffer = self._log_buffer, deque()
+            pending_logs.extend(log_batch)
+
+    @staticmethod
+    def _collect_db_item(
+        item: tuple,
+        pending_tasks: Dict[str, AsyncTask],
+        pending_logs: List[tuple]
+    ) -> bool:
+        """将一项写入请求合并到当前批次
 
-        print("[AsyncTaskManager] 数据库写入工作线程已结束")
+        Returns:
+            True 表示收到退出信号
+        """
+        task_id, data = item
+        if task_id is None:
+            return True
+
+        # 判断数据类型：AsyncTask 对象、日志数据字典、缓冲区批量日志或任务终态
+        if isinstance(data, dict) and data.get("type") == "log":
+            pending_logs.append((task_id, data))
+        elif task_id == AsyncTaskManager._LOG_BATCH_ITEM:
+            pending_logs.extend(data)
+        elif task_id == AsyncTaskManager._FINALIZE_ITEM:
+            task, logs = data
+            pending_tasks[task.task_id] = task
+            pending_logs.extend(logs)
+        elif isinstance(data, AsyncTask):
+            # 同一任务只保留最新状态
+            pending_tasks[task_id] = data
+        else:
+            logger.warning("警告: 未知的队列数据类型: %s", type(data))
+        return False
 
-    async def _do_sync_to_db(self, task_id: str, task: AsyncTask) -> None:
-        """实际执行数据库同步（异步版本）
+    async def _do_write_batch(
+        self,
+        db: "Session",
+        tasks: Dict[str, AsyncTask],
+        log_batch: Sequence[tuple]
+    ) -> None:
+        """在一个事务中写入一批任务状态和日志
 
-        使用类级别锁确保串行化写入，避免并发冲突。
+        先写任务再写日志（日志外键依赖任务记录）。整体写入失败时回滚，
+        再退回到任务、日志分别提交，避免个别坏数据拖累整批。
 
         Args:
-            task_id: 任务 ID
-            task: 任务对象
+            db: 数据库会话（由调用方管理生命周期）
+            tasks: {task_id: 任务对象}
+            log_batch: 日志批次，格式为 [(task_id, log_data), ...]
         """
-        from app.database import SessionLocal
+        if not tasks or not log_batch:
+            if tasks:
+                await self._do_sync_batch(db, tasks)
+            if log_batch:
+                await self._do_add_log_batch(db, log_batch)
+            return
+
+        from app.models.task import AsyncTaskLog
+
+        try:
+            on_commit = self._stage_task_batch(db, tasks)
+            AsyncTaskLog.bulk_insert(db, self._build_log_rows(log_batch))
+            db.commit()
+            on_commit()
+        except Exception as e:
+            logger.warning("合并写入失败，改为分别写入任务和日志: %s", e)
+            db.rollback()
+            await self._do_sync_batch(db, tasks)
+            await self._do_add_log_batch(db, log_batch)
+
+    async def _do_sync_batch(self, db: "Session", tasks: Dict[str, AsyncTask]) -> None:
+        """批量同步任务状态到数据库（一次事务）
+
+        整批写入失败时回滚，再逐个任务单独提交，个别坏数据不会拖累同批的其他任务；
+        仍然失败的任务重新标记为脏，由写入工作线程稍后重试。
 
-        # 使用类级别的锁确保所有数据库写入操作串行化
-        async with AsyncTaskManager._db_write_lock:
-            db = SessionLocal()
+        Args:
+            db: 数据库会话（由调用方管理生命周期）
+            tasks: {task_id: 任务对象}
+        """
+        try:
+            self._commit_task_batch(db, tasks)
+            return
+        except Exception as e:
+            db.rollback()
+            if len(tasks) > 1:
+                logger.warning("批量同步到数据库失败，改为逐个写入: %s", e)
+            else:
+                self._retry_failed_sync(next(iter(tasks)), e)
+                return
+
+        for task_id, task in tasks.items():
             try:
-                from app.models.task import AsyncTask as AsyncTaskModel
-
-                db_task = db.query(AsyncTaskModel).filter(
-                    AsyncTaskModel.task_id == task_id
-                ).first()
-
-                if db_task:
-                    # 更新现有记录
-                    db_task.status = AsyncTaskStatus(task.status.value)
-                    db_task.progress = task.progress
-                    db_task.total_batches = task.total_batches
-                    db_task.completed_batches = task.completed_batches
-                    db_task.message = task.message
-                    db_task.result = task.result
-                    db_task.error = task.error
-                    db_task.started_at = task.started_at
-                    db_task.completed_at = task.completed_at
-                    db_task.request_params = task.request_params
-                else:
-                    # 创建新记录
-                    # 优先从任务对象获取 user_id，如果没有则从字典获取
-                    user_id = task.user_id or self._task_user_ids.get(task_id)
-                    if not user_id:
-                        print(f"[AsyncTaskManager] 警告: 任务 {task_id} 没有 user_id，跳过数据库写入")
-                        return
-
-                    db_task = AsyncTaskModel(
-                        task_id=task_id,
-                        task_type=task.task_type,
-                        status=AsyncTaskStatus(task.status.value),
-                        progress=task.progress,
-                        total_batches=task.total_batches,
-                        completed_batches=task.completed_batches,
-                        message=task.message,
-                        result=task.result,
-                        error=task.error,
-                        user_id=user_id,
-                        request_params=task.request_params,
-                        created_at=task.created_at,
-                        started_at=task.started_at,
-                        completed_at=task.completed_at
-                    )
-                    db.add(db_task)
-
-                db.commit()
+                self._commit_task_batch(db, {task_id: task})
             except Exception as e:
-                print(f"[AsyncTaskManager] 同步到数据库失败: {e}")
                 db.rollback()
-            finally:
-                db.close()
+                self._retry_failed_sync(task_id, e)
+
+    def _commit_task_batch(self, db: "Session", tasks: Dict[str, AsyncTask]) -> None:
+        """在一个事务中写入并提交一批任务状态，提交成功后才清除脏标记"""
+        on_commit = self._stage_task_batch(db, tasks)
+        db.commit()
+        on_commit()
+
+    def _retry_failed_sync(self, task_id: str, error: Exception) -> None:
+        """任务同步失败：重新标记为脏等待下一批重试，连续失败过多时放弃"""
+        failures = self._sync_failures.get(task_id, 0) + 1
+        if failures >= self._SYNC_MAX_ATTEMPTS:
+            self._sync_failures.pop(task_id, None)
+            logger.error("任务 %s 同步到数据库连续失败 %d 次，放弃写入: %s", task_id, failures, error)
+            return
+        self._sync_failures[task_id] = failures
+        self._dirty_tasks.add(task_id)
+        logger.warning("任务 %s 同步到数据库失败，稍后重试: %s", task_id, error)
+
+    def _stage_task_batch(self, db: "Session", tasks: Dict[str, AsyncTask]) -> Callable[[], None]:
+        """在当前事务中写入任务状态（不提交）
+
+        已存在的记录只 UPDATE 修改过的字段（没有修改则跳过），不存在的记录批量 INSERT。
+        主键优先取自 _db_pk_cache，只有缓存未命中的任务才查询数据库；
+        INSERT 通过 RETURNING 取回新主键。
+
+        Returns:
+            提交成功后调用的回调：清空任务的脏字段标记并更新主键缓存
+        """
+        from sqlalchemy import select, insert
+        from app.models.task import AsyncTask as AsyncTaskModel
+
+        pk_cache = self._db_pk_cache
+        existing = {task_id: pk_cache[task_id] for task_id in tasks if task_id in pk_cache}
+        uncached = [task_id for task_id in tasks if task_id not in existing]
+        if uncached:
+            existing.update(db.execute(
+                select(AsyncTaskModel.task_id, AsyncTaskModel.id)
+                .where(AsyncTaskModel.task_id.in_(uncached))
+            ).all())
+
+        updates = []
+        inserts = []
+        written = []
+        for task_id, task in tasks.items():
+            pk = existing.get(task_id)
+            if pk is not None:
+                # 更新现有记录：只写修改过的字段
+                if not task._dirty:
+                    continue
+                row = {name: getattr(task, name) for name in task._dirty}
+                for name in _TIMESTAMP_FIELDS.intersection(row):
+                    row[name] = _from_epoch(row[name])
+                row["id"] = pk
+                updates.append(row)
+                written.append(task)
+                continue
+
+            # 创建新记录
+            # 优先从任务对象获取 user_id，如果没有则从字典获取
+            user_id = task.user_id or self._task_user_ids.get(task_id)
+            if not user_id:
+                logger.warning("警告: 任务 %s 没有 user_id，跳过数据库写入", task_id)
+                continue
+
+            row = {name: getattr(task, name) for name in _SYNC_FIELDS}
+            row.update(
+                task_id=task_id,
+                task_type=task.task_type,
+                user_id=user_id,
+                created_at=task.created_at
+            )
+            for name in _TIMESTAMP_FIELDS:
+                row[name] = _from_epoch(row[name])
+            inserts.append(row)
+            written.append(task)
+
+        inserted = []
+        if inserts:
+            inserted = db.execute(
+                insert(AsyncTaskModel).returning(AsyncTaskModel.task_id, AsyncTaskModel.id),
+                inserts
+            ).all()
+        if updates:
+            db.bulk_update_mappings(AsyncTaskModel, updates)
+
+        def on_commit() -> None:
+            for task in written:
+                task._dirty.clear()
+            if self._sync_failures:
+                for task_id in tasks:
+                    self._sync_failures.pop(task_id, None)
+            # 事务提交后才缓存主键，回滚时不会留下无效的映射
+            pk_cache.update(existing)
+            pk_cache.update(inserted)
+
+        return on_commit
+
+    async def _bulk_sync_to_db(self, tasks: Dict[str, AsyncTask]) -> None:
+        """直接将一批任务同步到数据库（不经过队列，如关闭时使用）
+
+        所有任务共用一个会话和一次事务。
+
+        Args:
+            tasks: {task_id: 任务对象}
+        """
+        if not tasks:
+            return
+        from app.database import SessionLocal
+
+        db = SessionLocal()
+        try:
+            await self._do_sync_batch(db, tasks)
+        finally:
+            db.close()
+
+    def _ensure_db_worker(self) -> bool:
+        """确保写入工作线程已启动（正常情况下由 start() 在应用启动时启动）
+
+        Returns:
+            不在异步上下文中、无法启动工作线程时返回 False
+        """
+        if self._db_worker_task is None or self._db_worker_task.done():
+            # 使用 asyncio.create_task 启动工作线程
+            # 注意：这需要在异步上下文中调用
+            try:
+                loop = asyncio.get_running_loop()
+                worker_task = loop.create_task(self._start_db_worker())
+                # 添加回调以确保工作线程已启动
+                worker_task.add_done_callback(lambda t: logger.info("工作线程启动完成"))
+            except RuntimeError:
+                # 不在异步上下文中，跳过同步
+                logger.warning("警告: 不在异步上下文中，无法启动数据库工作线程")
+                return False
+        return True
+
+    def _finalize_task(self, task_id: str, task: AsyncTask, message: str, level: str) -> None:
+        """持久化任务终态：任务状态、缓冲区日志和最终日志作为一个写入请求提交
+
+        写入工作线程在同一个事务中写入任务终态和这些日志，
+        取代原先的状态同步、日志入队、缓冲区刷新三次独立写入。
+
+        Args:
+            task_id: 任务 ID
+            task: 任务对象（终态字段已设置）
+            message: 最终日志消息
+            level: 最终日志级别
+        """
+        # 连同缓冲区中尚未刷新的日志一起提交
+        log_batch, self._log_buffer = self._log_buffer, deque()
+        if _LEVEL_NUM.get(level, 1) >= self._log_level_num:
+            log_batch.append((task_id, {"type": "log", "level": level, "message": message}))
+
+        if not self._ensure_db_worker():
+            self._log_buffer = log_batch
+            return
+        try:
+            self._db_queue.put_nowait((self._FINALIZE_ITEM, (task, log_batch)))
+        except asyncio.QueueFull:
+            # 退回到脏任务标记和日志缓冲区，由后续批次写入
+            logger.warning("警告: 数据库写入队列已满，任务 %s 终态延后写入", task_id)
+            self._dirty_tasks.add(task_id)
+            self._log_buffer = log_batch
 
     def _sync_to_db(self, task_id: str, task: AsyncTask) -> None:
         """同步任务状态到数据库（通过队列实现串行化写入）
@@ -398,41 +864,25 @@ class AsyncTaskManager:
             task: 任务对象
         """
         try:
-            # 确保工作线程已启动
-            if self._db_worker_task is None or self._db_worker_task.done():
-                # 使用 asyncio.create_task 启动工作线程
-                # 注意：这需要在异步上下文中调用
-                try:
-                    loop = asyncio.get_running_loop()
-                    worker_task = loop.create_task(self._start_db_worker())
-                    # 添加回调以确保工作线程已启动
-                    worker_task.add_done_callback(lambda t: print(f"[AsyncTaskManager] 工作线程启动完成"))
-                except RuntimeError:
-                    # 不在异步上下文中，跳过同步
-                    print(f"[AsyncTaskManager] 警告: 不在异步上下文中，无法启动数据库工作线程")
-                    return
+            if not self._ensure_db_worker():
+                return
 
             # 将同步请求放入队列（非阻塞）
             try:
                 self._db_queue.put_nowait((task_id, task))
             except asyncio.QueueFull:
-                print(f"[AsyncTaskManager] 警告: 数据库写入队列已满，跳过同步任务 {task_id}")
+                logger.warning("警告: 数据库写入队列已满，跳过同步任务 %s", task_id)
         except Exception as e:
-            print(f"[AsyncTaskManager] 添加到同步队列失败: {e}")
+            logger.error("添加到同步队列失败: %s", e)
 
-    def _should_log(self, level: str) -> bool:
-        """检查是否应该记录该级别的日志
+    def set_log_level(self, level: str) -> None:
+        """设置日志级别（同时预先计算级别数值）
 
         Args:
-            level: 日志级别
-
-        Returns:
-            True 如果应该记录，False 否则
+            level: 日志级别 (debug/info/warning/error)，无法识别时按 info 处理
         """
-        levels = {"debug": 0, "info": 1, "warning": 2, "error": 3}
-        current_level = levels.get(self._log_level.lower(), 1)
-        msg_level = levels.get(level.lower(), 1)
-        return msg_level >= current_level
+        self._log_level = level.lower()
+        self._log_level_num = _LEVEL_NUM.get(self._log_level, 1)
 
     def add_log(self, task_id: str, message: str, level: str = "info", **kwargs) -> None:
         """添加任务日志（异步方式，通过队列，支持扩展字段）
@@ -455,181 +905,241 @@ class AsyncTaskManager:
                 - total_batches: 总批次数
         """
         try:
-            # 日志级别过滤
-            if not self._should_log(level):
+            # 日志级别过滤（级别数值只查一次，后续判断复用）
+            level_num = _LEVEL_NUM.get(level, 1)
+            if level_num < self._log_level_num:
                 return
 
-            # 确保工作线程已启动
-            if self._db_worker_task is None or self._db_worker_task.done():
-                try:
-                    loop = asyncio.get_running_loop()
-                    loop.create_task(self._start_db_worker())
-                except RuntimeError:
-                    print(f"[AsyncTaskManager] 警告: 不在异步上下文中，无法添加日志")
-                    return
-
+            # 写入工作线程在应用启动时由 start() 启动，这里只做入队/入缓冲区
             # ERROR 和 WARNING 级别立即写入，INFO 和 DEBUG 进入缓冲区
             log_data = {"type": "log", "level": level, "message": message, **kwargs}
 
-            if level in ("error", "warning"):
+            if level_num >= _LEVEL_NUM["warning"]:
                 # 重要日志立即写入
                 try:
                     self._db_queue.put_nowait((task_id, log_data))
                 except asyncio.QueueFull:
-                    print(f"[AsyncTaskManager] 警告: 数据库写入队列已满，跳过日志记录")
+                    logger.warning("警告: 数据库写入队列已满，跳过日志记录")
             else:
-                # INFO 和 DEBUG 日志进入缓冲区
-                try:
-                    loop = asyncio.get_running_loop()
-                    loop.create_task(self._add_to_log_buffer(task_id, log_data))
-                except RuntimeError:
-                    # 不在异步上下文中，直接放入队列
-                    try:
-                        self._db_queue.put_nowait((task_id, log_data))
-                    except asyncio.QueueFull:
-                        print(f"[AsyncTaskManager] 警告: 数据库写入队列已满，跳过日志记录")
-
-        except Exception as e:
-            print(f"[AsyncTaskManager] 添加日志到队列失败: {e}")
+                # INFO 和 DEBUG 日志直接追加到缓冲区
+                self._log_buffer.append((task_id, log_data))
 
-    async def _add_to_log_buffer(self, task_id: str, log_data: dict) -> None:
-        """添加日志到缓冲区
+                # 缓冲区达到批量大小时唤醒刷新任务
+                if len(self._log_buffer) >= self._log_flush_threshold:
+                    self._log_flush_event.set()
 
-        Args:
-            task_id: 任务 ID
-            log_data: 日志数据
-        """
-        async with self._log_buffer_lock:
-            self._log_buffer.append((task_id, log_data))
-
-            # 检查是否需要刷新
-            if len(self._log_buffer) >= self._LOG_BATCH_SIZE:
-                await self._flush_log_buffer()
+        except Exception as e:
+            logger.error("添加日志到队列失败: %s", e)
 
     async def _flush_log_buffer(self) -> None:
         """刷新日志缓冲区到数据库
 
-        批量写入缓冲区中的所有日志
+        双缓冲：已满的缓冲区整体交给写入工作线程，add_log 立即改写新缓冲区，
+        写入期间生产者不会等待，也无需加锁。
         """
-        async with self._log_buffer_lock:
-            if not self._log_buffer:
-                return
+        if not self._log_buffer:
+            return
 
-            log_batch = self._log_buffer.copy()
-            self._log_buffer.clear()
+        # 整体替换缓冲区，刷新期间新到的日志进入新缓冲区
+        log_batch, self._log_buffer = self._log_buffer, deque()
 
-        # 批量写入
-        await self._do_add_log_batch(log_batch)
+        # 交给数据库写入工作线程批量写入，保证任务记录先于其日志写入（日志外键依赖任务记录）
+        try:
+            self._db_queue.put_nowait((self._LOG_BATCH_ITEM, log_batch))
+        except asyncio.QueueFull:
+            # 放回缓冲区（保持先后顺序），由写入工作线程下次唤醒时一并写入
+            logger.warning("警告: 数据库写入队列已满，%d 条缓冲日志延后写入", len(log_batch))
+            log_batch.extend(self._log_buffer)
+            self._log_buffer = log_batch
         self._last_flush_time = asyncio.get_event_loop().time()
 
-    async def _do_add_log_batch(self, log_batch: List[tuple]) -> None:
+    async def _do_add_log_batch(self, db: "Session", log_batch: Sequence[tuple]) -> None:
         """批量添加日志到数据库
 
         Args:
+            db: 数据库会话（由调用方管理生命周期）
             log_batch: 日志批次，格式为 [(task_id, log_data), ...]
         """
-        from app.database import SessionLocal
-        from app.models.task import AsyncTaskLog, TaskLogLevel
+        from sqlalchemy import select
+        from app.models.task import AsyncTask as AsyncTaskModel, AsyncTaskLog
 
         if not log_batch:
             return
 
-        async with AsyncTaskManager._db_write_lock:
-            db = SessionLocal()
-            try:
-                log_entries = []
-                for task_id, log_data in log_batch:
-                    level = log_data.get("level", "info")
-                    message = log_data.get("message", "")
-
-                    # 验证日志级别
-                    log_level = TaskLogLevel(level) if level in [e.value for e in TaskLogLevel] else TaskLogLevel.INFO
-
-                    # 创建日志条目
-                    log_entry = AsyncTaskLog(
-                        task_id=task_id,
-                        level=log_level,
-                        message=message,
-                        step_name=log_data.get("step_name"),
-                        step_number=log_data.get("step_number"),
-                        total_steps=log_data.get("total_steps"),
-                        duration_ms=log_data.get("duration_ms"),
-                        agent_name=log_data.get("agent_name"),
-                        agent_type=log_data.get("agent_type"),
-                        model_name=log_data.get("model_name"),
-                        provider=log_data.get("provider"),
-                        estimated_tokens=log_data.get("estimated_tokens"),
-                        current_batch=log_data.get("current_batch"),
-                        total_batches=log_data.get("total_batches"),
-                    )
-                    log_entries.append(log_entry)
-
-                db.add_all(log_entries)
-                db.commit()
-                print(f"[AsyncTaskManager] 批量写入 {len(log_entries)} 条日志")
-            except Exception as e:
-                print(f"[AsyncTaskManager] 批量写入日志失败: {e}")
-                db.rollback()
-            finally:
-                db.close()
+        rows = self._build_log_rows(log_batch)
+        try:
+            AsyncTaskLog.bulk_insert(db, rows)
+            db.commit()
+            logger.debug("批量写入 %d 条日志", len(rows))
+            return
+        except Exception as e:
+            logger.warning("批量写入日志失败，剔除无对应任务记录的日志后重试: %s", e)
+            db.rollback()
+
+        # 整批失败通常是个别日志的任务记录不存在（外键约束），只丢弃这些行
+        try:
+            task_ids = {row["task_id"] for row in rows}
+            existing = set(db.scalars(
+                select(AsyncTaskModel.task_id).where(AsyncTaskModel.task_id.in_(task_ids))
+            ))
+            kept = [row for row in rows if row["task_id"] in existing]
+            AsyncTaskLog.bulk_insert(db, kept)
+            db.commit()
+            if len(kept) < len(rows):
+                logger.warning("丢弃 %d 条无对应任务记录的日志", len(rows) - len(kept))
+        except Exception as e:
+            logger.error("批量写入日志失败: %s", e)
+            db.rollback()
+
+    @staticmethod
+    def _build_log_rows(log_batch: Sequence[tuple]) -> List[Dict[str, Any]]:
+        """构建日志行（批量 INSERT 要求每行键一致），未知级别按 INFO 处理"""
+        rows = []
+        for task_id, log_data in log_batch:
+            rows.append({
+                "task_id": task_id,
+                "level": _LOG_LEVELS.get(log_data.get("level"), TaskLogLevel.INFO),
+                "message": log_data.get("message", ""),
+                "step_name": log_data.get("step_name"),
+                "step_number": log_data.get("step_number"),
+                "total_steps": log_data.get("total_steps"),
+                "duration_ms": log_data.get("duration_ms"),
+                "agent_name": log_data.get("agent_name"),
+                "agent_type": log_data.get("agent_type"),
+                "model_name": log_data.get("model_name"),
+                "provider": log_data.get("provider"),
+                "estimated_tokens": log_data.get("estimated_tokens"),
+                "current_batch": log_data.get("current_batch"),
+                "total_batches": log_data.get("total_batches"),
+            })
+        return rows
+
+    def _enqueue_pending(self, task_id: str) -> None:
+        """将任务加入等待队列尾部"""
+        self._queue_positions[task_id] = self._queue_head_seq + len(self._pending_queue)
+        self._pending_queue.append(task_id)
+
+    def _popleft_pending(self) -> str:
+        """从等待队列头部取出任务"""
+        task_id = self._pending_queue.popleft()
+        del self._queue_positions[task_id]
+        self._queue_head_seq += 1
+        self._drop_head_tombstones()
+        return task_id
+
+    def _drop_head_tombstones(self) -> None:
+        """丢弃队首的墓碑，保证队首始终是仍在等待的任务"""
+        queue = self._pending_queue
+        tombstones = self._cancelled_pending
+        while queue and self._queue_head_seq in tombstones:
+            tombstones.remove(self._queue_head_seq)
+            queue.popleft()
+            self._queue_head_seq += 1
+
+    def _remove_pending(self, task_id: str) -> bool:
+        """从等待队列中移除任务，返回任务此前是否在队列中
+
+        队首任务直接出队；队列中间的任务只记录墓碑（惰性删除），
+        避免 deque.remove 和重排序号的 O(n) 开销。
+        """
+        seq = self._queue_positions.pop(task_id, None)
+        if seq is None:
+            return False
+        if seq == self._queue_head_seq:
+            self._pending_queue.popleft()
+            self._queue_head_seq += 1
+            self._drop_head_tombstones()
+            return True
+        self._cancelled_pending.add(seq)
+        return True
+
+    def _rebuild_pending(self, removed: set) -> None:
+        """一次遍历重建等待队列：去掉 removed 中的任务和所有墓碑，重新编排序号"""
+        tombstones = self._cancelled_pending
+        live = [task_id for seq, task_id in enumerate(self._pending_queue, self._queue_head_seq)
+                if seq not in tombstones and task_id not in removed]
+        self._pending_queue = deque(live)
+        self._queue_positions = {task_id: seq for seq, task_id in enumerate(live)}
+        self._queue_head_seq = 0
+        self._cancelled_pending = set()
+
+    def _queue_position(self, task_id: str) -> Optional[int]:
+        """获取任务在等待队列中的位置（从 1 开始），不在队列中返回 None"""
+        seq = self._queue_positions.get(task_id)
+        if seq is None:
+            return None
+        # 扣除排在前面的墓碑（墓碑数量通常很少）
+        ahead = sum(1 for dead_seq in self._cancelled_pending if dead_seq < seq)
+        return seq - self._queue_head_seq - ahead + 1
 
-    async def _do_add_log(self, task_id: str, log_data: dict) -> None:
-        """实际执行日志添加（异步版本，支持扩展字段）
+    def _set_task_status(self, task: AsyncTask, status: AsyncTaskStatus) -> None:
+        """修改任务状态，同时维护按状态分组的索引和状态版本号
 
-        使用类级别锁确保串行化写入，避免并发冲突。
+        所有状态变更都应通过此方法进行。
+        """
+        by_status = self._tasks_by_status
+        by_status[task.status].discard(task.task_id)
+        by_status[status].add(task.task_id)
+        task.status = status
+        task.mark_dirty("status")
+        self._state_version += 1
+        if status in _TERMINAL_STATUSES and task.task_id in self._tasks:
+            self._tasks.move_to_end(task.task_id)
+
+    def _cleanup_task_state(self, task_id: str, *, cancel_running: bool) -> None:
+        """任务进入终态后清理运行时状态（asyncio 任务、用户 ID 缓存、进度缓存）
 
         Args:
             task_id: 任务 ID
-            log_data: 日志数据字典
+            cancel_running: 是否取消仍在运行的 asyncio 任务
         """
-        from app.database import SessionLocal
-        from app.models.task import AsyncTaskLog, TaskLogLevel
+        running = self._running_tasks.pop(task_id, None)
+        if running is not None and cancel_running:
+            running.cancel()
+        self._task_user_ids.pop(task_id, None)
+        self._progress_cache.pop(task_id, None)
 
-        # 使用类级别的锁确保所有数据库写入操作串行化
-        async with AsyncTaskManager._db_write_lock:
-            db = SessionLocal()
-            try:
-                level = log_data.get("level", "info")
-                message = log_data.get("message", "")
-
-                # 验证日志级别
-                log_level = TaskLogLevel(level) if level in [e.value for e in TaskLogLevel] else TaskLogLevel.INFO
-
-                # 创建日志条目（包含扩展字段）
-                log_entry = AsyncTaskLog(
-                    task_id=task_id,
-                    level=log_level,
-                    message=message,
-                    # 扩展字段
-                    step_name=log_data.get("step_name"),
-                    step_number=log_data.get("step_number"),
-                    total_steps=log_data.get("total_steps"),
-                    duration_ms=log_data.get("duration_ms"),
-                    agent_name=log_data.get("agent_name"),
-                    agent_type=log_data.get("agent_type"),
-                    model_name=log_data.get("model_name"),
-                    provider=log_data.get("provider"),
-                    estimated_tokens=log_data.get("estimated_tokens"),
-                    current_batch=log_data.get("current_batch"),
-                    total_batches=log_data.get("total_batches"),
-                )
-                db.add(log_entry)
-                db.commit()
-                print(f"[AsyncTaskManager] 任务 {task_id} 添加日志: [{level}] {message[:50]}...")
-            except Exception as e:
-                print(f"[AsyncTaskManager] 添加日志失败: {e}")
-                db.rollback()
-            finally:
-                db.close()
+    def _evict_finished_tasks(self, limit: Optional[int] = None, min_age: float = 0.0) -> int:
+        """内存任务数超出上限时，从最久未使用的一端淘汰终态任务
+
+        未结束的任务和结束不足 min_age 秒的任务不会被淘汰。
+
+        Args:
+            limit: 内存任务数上限，默认为 _max_cached_tasks
+            min_age: 终态任务至少结束多少秒后才允许淘汰
+
+        Returns:
+            淘汰的任务数
+        """
+        if limit is None:
+            limit = self._max_cached_tasks
+        excess = len(self._tasks) - limit
+        if excess <= 0:
+            return 0
+
+        cutoff = time.time() - min_age
+        victims = []
+        for task_id, task in self._tasks.items():
+            if task.status in _TERMINAL_STATUSES and (task.completed_at or 0) <= cutoff:
+                victims.append(task_id)
+                if len(victims) >= excess:
+                    break
+
+        for task_id in victims:
+            task = self._tasks.pop(task_id)
+            self._tasks_by_status[task.status].discard(task_id)
+            self._cleanup_task_state(task_id, cancel_running=False)
+            self._db_pk_cache.pop(task_id, None)
+            self._sync_failures.pop(task_id, None)
+        return len(victims)
 
     def get_running_task_count(self) -> int:
         """获取当前正在运行的任务数"""
-        return sum(1 for task in self._tasks.values() 
-                   if task.status == AsyncTaskStatus.RUNNING)
+        return len(self._tasks_by_status[AsyncTaskStatus.RUNNING])
     
     def get_pending_task_count(self) -> int:
         """获取等待执行的任务数"""
-        return len(self._pending_queue)
+        return len(self._pending_queue) - len(self._cancelled_pending)
     
     def can_start_new_task(self) -> bool:
         """检查是否可以启动新任务
@@ -647,7 +1157,7 @@ class AsyncTaskManager:
         Returns:
             队列是否已满
         """
-        return len(self._pending_queue) >= self._queue_size
+        return len(self._pending_queue) - len(self._cancelled_pending) >= self._queue_size
     
     def create_task(self, task_type: str, total_batches: int = 1) -> str:
         """创建新任务，返回任务ID
@@ -675,14 +1185,22 @@ class AsyncTaskManager:
             total_batches=total_batches
         )
         self._tasks[task_id] = task
+        self._tasks_by_status[task.status].add(task_id)
+        self._state_version += 1
+        self._evict_finished_tasks()
 
-        print(f"[AsyncTaskManager] ✓ 创建任务: {task_id[:8]}... | 类型: {task_type} | 总批次: {total_batches}")
+        # INFO 被屏蔽时跳过日志字符串的构建
+        verbose = logger.isEnabledFor(logging.INFO)
+        short_id = task_id[:8]
+        if verbose:
+            logger.info("✓ 创建任务: %s... | 类型: %s | 总批次: %s", short_id, task_type, total_batches)
 
         # 如果达到并发限制，加入等待队列
         if not self.can_start_new_task():
-            self._pending_queue.append(task_id)
-            print(f"[AsyncTaskManager] ⏳ 任务 {task_id[:8]}... 已加入等待队列 "
-                  f"(当前运行: {self.get_running_task_count()}/{self._max_concurrent_tasks})")
+            self._enqueue_pending(task_id)
+            if verbose:
+                logger.info("⏳ 任务 %s... 已加入等待队列 (当前运行: %d/%d)",
+                            short_id, self.get_running_task_count(), self._max_concurrent_tasks)
 
         return task_id
     
@@ -694,10 +1212,14 @@ class AsyncTaskManager:
         """获取任务状态"""
         task = self._tasks.get(task_id)
         if task:
+            # 只有终态任务参与淘汰，未结束的任务无需调整访问顺序
+            if task.status in _TERMINAL_STATUSES:
+                self._tasks.move_to_end(task_id)
             status_dict = task.to_dict()
             # 添加队列位置信息
-            if task_id in self._pending_queue:
-                status_dict["queue_position"] = self._pending_queue.index(task_id) + 1
+            queue_position = self._queue_position(task_id)
+            if queue_position is not None:
+                status_dict["queue_position"] = queue_position
             return status_dict
         return None
     
@@ -711,17 +1233,20 @@ class AsyncTaskManager:
         task = self._tasks.get(task_id)
         if task:
             task.completed_batches = completed_batches
+            task.mark_dirty("completed_batches")
             if task.total_batches > 0:
                 # 进度范围：5% ~ 95%（留5%给启动，5%给保存）
                 raw_progress = (completed_batches / task.total_batches) * 90
                 task.progress = int(5 + raw_progress)
+                task.mark_dirty("progress")
 
             # 打印批次进度
-            if task.total_batches > 1:
-                print(f"[AsyncTaskManager] 📊 任务 {task_id[:8]}... 批次进度: {completed_batches}/{task.total_batches} ({task.progress}%)")
+            if task.total_batches > 1 and logger.isEnabledFor(logging.DEBUG):
+                logger.debug("📊 任务 %s... 批次进度: %s/%s (%s%%)",
+                             task_id[:8], completed_batches, task.total_batches, task.progress)
 
-            # 同步到数据库
-            self._sync_to_db(task_id, task)
+            # 标记待写入，由写入工作线程合并写入数据库
+            self._dirty_tasks.add(task_id)
 
     def update_progress(self, task_id: str, progress: int, message: str = None):
         """直接设置任务进度百分比（带节流优化）
@@ -731,56 +1256,54 @@ class AsyncTaskManager:
             progress: 进度百分比（0-100）
             message: 可选的进度消息
         """
-        import time
-
         task = self._tasks.get(task_id)
         if not task:
             return
 
         # 更新任务对象
         task.progress = min(max(progress, 0), 100)
+        task.mark_dirty("progress")
         if message:
             task.message = message
+            task.mark_dirty("message")
 
         # 获取或创建缓存
-        cache = self._progress_cache.get(task_id, {
-            "last_progress": -1,
-            "last_update_time": 0,
-            "pending_message": None
-        })
+        cache = self._progress_cache.get(task_id)
+        if cache is None:
+            cache = self._progress_cache[task_id] = _ProgCache()
 
         # 计算变化
-        progress_delta = abs(task.progress - cache["last_progress"])
-        time_delta = time.time() - cache["last_update_time"]
+        now = time.monotonic()
+        progress_delta = abs(task.progress - cache.last_progress)
+        time_delta = now - cache.last_update_time
 
         # 判断是否需要更新数据库
         should_update = (
             progress == 0 or  # 任务开始
             progress == 100 or  # 任务结束
-            cache["last_progress"] == -1 or  # 首次更新
+            cache.last_progress == -1 or  # 首次更新
             progress_delta >= self._PROGRESS_UPDATE_THRESHOLD or
             time_delta >= self._PROGRESS_UPDATE_INTERVAL
         )
 
         if should_update:
-            # 同步到数据库
-            self._sync_to_db(task_id, task)
+            # 标记待写入，由写入工作线程合并写入数据库
+            self._dirty_tasks.add(task_id)
 
             # 在关键节点打印日志
-            if task.progress == 50:
-                print(f"[AsyncTaskManager] 🔄 任务 {task_id[:8]}... 进度 50%{f' | {message}' if message else ''}")
-            elif task.progress == 100:
-                print(f"[AsyncTaskManager) ✔ 任务 {task_id[:8]}... 进度 100%{f' | {message}' if message else ''}")
+            if logger.isEnabledFor(logging.DEBUG):
+                if task.progress == 50:
+                    logger.debug("🔄 任务 %s... 进度 50%%%s", task_id[:8], f" | {message}" if message else "")
+                elif task.progress == 100:
+                    logger.debug("✔ 任务 %s... 进度 100%%%s", task_id[:8], f" | {message}" if message else "")
 
             # 更新缓存
-            cache["last_progress"] = task.progress
-            cache["last_update_time"] = time.time()
-            self._progress_cache[task_id] = cache
+            cache.last_progress = task.progress
+            cache.last_update_time = now
         else:
             # 只更新缓存中的 pending_message
             if message:
-                cache["pending_message"] = message
-                self._progress_cache[task_id] = cache
+                cache.pending_message = message
 
     def force_progress_update(self, task_id: str):
         """强制立即更新进度到数据库
@@ -790,17 +1313,16 @@ class AsyncTaskManager:
         Args:
             task_id: 任务 ID
         """
-        import time
-
         task = self._tasks.get(task_id)
         if task:
             # 同步到数据库
             self._sync_to_db(task_id, task)
 
             # 更新缓存
-            if task_id in self._progress_cache:
-                self._progress_cache[task_id]["last_progress"] = task.progress
-                self._progress_cache[task_id]["last_update_time"] = time.time()
+            cache = self._progress_cache.get(task_id)
+            if cache is not None:
+                cache.last_progress = task.progress
+                cache.last_update_time = time.monotonic()
 
     def start_task(self, task_id: str) -> bool:
         """标记任务开始
@@ -815,20 +1337,24 @@ class AsyncTaskManager:
         if not task:
             return False
 
-        # 检查是否可以启动
-        if not self.can_start_new_task() and task_id not in self._pending_queue:
-            # 如果不能启动且不在队列中，加入队列
-            self._pending_queue.append(task_id)
+        # 检查是否可以启动：没有空闲槽位时留在（或加入）等待队列
+        if not self.can_start_new_task():
+            if task_id not in self._queue_positions:
+                self._enqueue_pending(task_id)
             return False
 
+        verbose = logger.isEnabledFor(logging.INFO)
+        short_id = task_id[:8]
+
         # 从等待队列中移除
-        if task_id in self._pending_queue:
-            self._pending_queue.remove(task_id)
-            print(f"[AsyncTaskManager] 🚀 任务 {task_id[:8]}... 从等待队列中取出并启动")
+        if self._remove_pending(task_id):
+            if verbose:
+                logger.info("🚀 任务 %s... 从等待队列中取出并启动", short_id)
 
-        task.status = AsyncTaskStatus.RUNNING
-        task.started_at = datetime.utcnow()
+        self._set_task_status(task, AsyncTaskStatus.RUNNING)
+        task.started_at = time.time()
         task.progress = 5  # 设置初始进度，表示任务已开始
+        task.mark_dirty("started_at", "progress")
 
         # 同步到数据库
         self._sync_to_db(task_id, task)
@@ -836,7 +1362,8 @@ class AsyncTaskManager:
         # 记录日志
         self.add_log(task_id, "任务开始执行", "info")
 
-        print(f"[AsyncTaskManager] ▶ 任务 {task_id[:8]}... 开始执行 | 类型: {task.task_type}")
+        if verbose:
+            logger.info(_TASK_STARTED_FMT, short_id, task.task_type)
 
         return True
 
@@ -847,48 +1374,32 @@ class AsyncTaskManager:
             task_id: 任务 ID
             result: 任务结果
         """
-        # 先刷新日志缓冲区，确保所有日志都被写入
-        try:
-            loop = asyncio.get_running_loop()
-            loop.create_task(self._flush_log_buffer())
-        except RuntimeError:
-            pass
-
         task = self._tasks.get(task_id)
         if task:
-            task.status = AsyncTaskStatus.COMPLETED
+            self._set_task_status(task, AsyncTaskStatus.COMPLETED)
             task.progress = 100
             task.result = result
-            task.completed_at = datetime.utcnow()
-
-            # 强制同步到数据库
-            self.force_progress_update(task_id)
-
-            # 记录日志
-            self.add_log(task_id, "任务执行完成", "info")
-
-            # 计算执行时长
-            if task.started_at:
-                duration = (task.completed_at - task.started_at).total_seconds()
-                print(f"[AsyncTaskManager] ✅ 任务 {task_id[:8]}... 执行完成 | "
-                      f"类型: {task.task_type} | 耗时: {duration:.2f}秒")
-            else:
-                print(f"[AsyncTaskManager] ✅ 任务 {task_id[:8]}... 执行完成 | 类型: {task.task_type}")
-
-        # 清理运行中的任务
-        if task_id in self._running_tasks:
-            del self._running_tasks[task_id]
-
-        # 清理用户 ID 缓存
-        if task_id in self._task_user_ids:
-            del self._task_user_ids[task_id]
+            task.completed_at = time.time()
+            task.mark_dirty("progress", "result", "completed_at")
+
+            # 终态和日志一次写入数据库
+            self._finalize_task(task_id, task, "任务执行完成", "info")
+
+            # 计算执行时长（INFO 被屏蔽时跳过）
+            if logger.isEnabledFor(logging.INFO):
+                short_id = task_id[:8]
+                if task.started_at:
+                    logger.info(_TASK_DONE_FMT, short_id, task.task_type,
+                                task.completed_at - task.started_at)
+                else:
+                    logger.info(_TASK_DONE_NO_DURATION_FMT, short_id, task.task_type)
 
-        # 清理进度缓存
-        if task_id in self._progress_cache:
-            del self._progress_cache[task_id]
+        # 清理运行时状态（任务自身的协程正在执行此方法，不取消）
+        self._cleanup_task_state(task_id, cancel_running=False)
 
-        # 尝试启动等待队列中的下一个任务
-        self._process_pending_queue()
+        # 尝试启动等待队列中的下一个任务（队列为空时跳过调用）
+        if self._pending_queue:
+            self._process_pending_queue()
 
     def fail_task(self, task_id: str, error: str):
         """标记任务失败
@@ -897,48 +1408,31 @@ class AsyncTaskManager:
             task_id: 任务 ID
             error: 错误信息
         """
-        # 先刷新日志缓冲区，确保所有日志都被写入
-        try:
-            loop = asyncio.get_running_loop()
-            loop.create_task(self._flush_log_buffer())
-        except RuntimeError:
-            pass
-
         task = self._tasks.get(task_id)
         if task:
-            task.status = AsyncTaskStatus.FAILED
+            self._set_task_status(task, AsyncTaskStatus.FAILED)
             task.error = error
-            task.completed_at = datetime.utcnow()
-
-            # 强制同步到数据库
-            self.force_progress_update(task_id)
-
-            # 记录日志
-            self.add_log(task_id, f"任务执行失败: {error}", "error")
-
-            # 计算执行时长
-            if task.started_at:
-                duration = (task.completed_at - task.started_at).total_seconds()
-                print(f"[AsyncTaskManager] ❌ 任务 {task_id[:8]}... 执行失败 | "
-                      f"类型: {task.task_type} | 耗时: {duration:.2f}秒 | 错误: {error}")
-            else:
-                print(f"[AsyncTaskManager] ❌ 任务 {task_id[:8]}... 执行失败 | "
-                      f"类型: {task.task_type} | 错误: {error}")
-
-        # 清理运行中的任务
-        if task_id in self._running_tasks:
-            del self._running_tasks[task_id]
-
-        # 清理用户 ID 缓存
-        if task_id in self._task_user_ids:
-            del self._task_user_ids[task_id]
+            task.completed_at = time.time()
+            task.mark_dirty("error", "completed_at")
+
+            # 终态和日志一次写入数据库
+            self._finalize_task(task_id, task, f"任务执行失败: {error}", "error")
+
+            # 计算执行时长（WARNING 被屏蔽时跳过）
+            if logger.isEnabledFor(logging.WARNING):
+                short_id = task_id[:8]
+                if task.started_at:
+                    logger.warning(_TASK_FAILED_FMT, short_id, task.task_type,
+                                   task.completed_at - task.started_at, error)
+                else:
+                    logger.warning(_TASK_FAILED_NO_DURATION_FMT, short_id, task.task_type, error)
 
-        # 清理进度缓存
-        if task_id in self._progress_cache:
-            del self._progress_cache[task_id]
+        # 清理运行时状态（任务自身的协程正在执行此方法，不取消）
+        self._cleanup_task_state(task_id, cancel_running=False)
 
-        # 尝试启动等待队列中的下一个任务
-        self._process_pending_queue()
+        # 尝试启动等待队列中的下一个任务（队列为空时跳过调用）
+        if self._pending_queue:
+            self._process_pending_queue()
 
     def timeout_task(self, task_id: str):
         """标记任务超时
@@ -949,44 +1443,26 @@ class AsyncTaskManager:
         Args:
             task_id: 任务 ID
         """
-        # 先刷新日志缓冲区，确保所有日志都被写入
-        try:
-            loop = asyncio.get_running_loop()
-            loop.create_task(self._flush_log_buffer())
-        except RuntimeError:
-            pass
-
         task = self._tasks.get(task_id)
         if task:
-            task.status = AsyncTaskStatus.TIMEOUT
+            self._set_task_status(task, AsyncTaskStatus.TIMEOUT)
             # 由于 _task_timeout 已移除，使用通用超时消息
             task.error = "任务执行超时"
-            task.completed_at = datetime.utcnow()
-
-            # 强制同步到数据库
-            self.force_progress_update(task_id)
+            task.completed_at = time.time()
+            task.mark_dirty("error", "completed_at")
 
-            # 记录日志
-            self.add_log(task_id, "任务执行超时", "error")
+            # 终态和日志一次写入数据库
+            self._finalize_task(task_id, task, "任务执行超时", "error")
 
             # 添加控制台日志输出
-            print(f"❌ [AsyncTaskManager] 任务 {task_id} 执行超时")
-
-        # 取消正在运行的 asyncio 任务
-        if task_id in self._running_tasks:
-            self._running_tasks[task_id].cancel()
-            del self._running_tasks[task_id]
+            logger.warning("任务 %s 执行超时", task_id)
 
-        # 清理用户 ID 缓存
-        if task_id in self._task_user_ids:
-            del self._task_user_ids[task_id]
+        # 取消正在运行的 asyncio 任务并清理运行时状态
+        self._cleanup_task_state(task_id, cancel_running=True)
 
-        # 清理进度缓存
-        if task_id in self._progress_cache:
-            del self._progress_cache[task_id]
-
-        # 尝试启动等待队列中的下一个任务
-        self._process_pending_queue()
+        # 尝试启动等待队列中的下一个任务（队列为空时跳过调用）
+        if self._pending_queue:
+            self._process_pending_queue()
 
     def cancel_task(self, task_id: str):
         """取消任务
@@ -996,30 +1472,25 @@ class AsyncTaskManager:
         """
         task = self._tasks.get(task_id)
         if task:
-            task.status = AsyncTaskStatus.CANCELLED
-            task.completed_at = datetime.utcnow()
-
-            # 同步到数据库
-            self._sync_to_db(task_id, task)
+            self._set_task_status(task, AsyncTaskStatus.CANCELLED)
+            task.completed_at = time.time()
+            task.mark_dirty("completed_at")
 
-            # 记录日志
-            self.add_log(task_id, "任务已取消", "warning")
+            # 终态和日志一次写入数据库
+            self._finalize_task(task_id, task, "任务已取消", "warning")
 
-        # 从等待队列中移除
-        if task_id in self._pending_queue:
-            self._pending_queue.remove(task_id)
-
-        # 取消正在运行的 asyncio 任务
-        if task_id in self._running_tasks:
-            self._running_tasks[task_id].cancel()
-            del self._running_tasks[task_id]
+        # 从等待队列中移除，并唤醒仍在等待准入的执行协程
+        self._remove_pending(task_id)
+        waiter = self._admission_waiters.pop(task_id, None)
+        if waiter is not None and not waiter.done():
+            waiter.cancel()
 
-        # 清理用户 ID 缓存
-        if task_id in self._task_user_ids:
-            del self._task_user_ids[task_id]
+        # 取消正在运行的 asyncio 任务并清理运行时状态
+        self._cleanup_task_state(task_id, cancel_running=True)
 
-        # 尝试启动等待队列中的下一个任务
-        self._process_pending_queue()
+        # 尝试启动等待队列中的下一个任务（队列为空时跳过调用）
+        if self._pending_queue:
+            self._process_pending_queue()
 
     def register_running_task(self, task_id: str, asyncio_task: asyncio.Task):
         """注册正在运行的 asyncio 任务
@@ -1029,6 +1500,17 @@ class AsyncTaskManager:
             asyncio_task: asyncio 任务对象
         """
         self._running_tasks[task_id] = asyncio_task
+        # 任务结束时自动移除引用，任何终态路径遗漏清理都不会泄漏 Task 对象。
+        # 不使用 WeakValueDictionary：调用方通常不保留 Task 引用，这里必须持有强引用，
+        # 否则运行中的任务可能被垃圾回收
+        asyncio_task.add_done_callback(
+            lambda finished: self._discard_running_task(task_id, finished)
+        )
+
+    def _discard_running_task(self, task_id: str, asyncio_task: asyncio.Task) -> None:
+        """asyncio 任务结束回调：仅当登记的仍是该任务对象时才移除"""
+        if self._running_tasks.get(task_id) is asyncio_task:
+            del self._running_tasks[task_id]
     
     async def execute_with_timeout(self, task_id: str, coro) -> Any:
         """执行任务（不应用超时限制）
@@ -1048,6 +1530,21 @@ class AsyncTaskManager:
         Returns:
             协程的返回值
         """
+        # 任务仍在等待队列中：挂起直到有空闲并发槽位，由 _process_pending_queue 启动并唤醒
+        if task_id in self._queue_positions:
+            waiter = asyncio.get_running_loop().create_future()
+            self._admission_waiters[task_id] = waiter
+            try:
+                await waiter
+            except BaseException:
+                # 排队期间被取消或等待超时：协程从未开始执行，直接关闭；
+                # 同时移出等待队列，否则之后会被启动并一直占用并发槽位
+                coro.close()
+                self._remove_pending(task_id)
+                raise
+            finally:
+                self._admission_waiters.pop(task_id, None)
+
         # 直接执行，不使用 asyncio.wait_for
         # 超时由 httpx.AsyncClient 的 timeout 参数控制
         return await coro
@@ -1055,21 +1552,29 @@ class AsyncTaskManager:
     def _process_pending_queue(self):
         """处理等待队列中的任务
 
-        当有任务完成时调用，尝试启动等待队列中的下一个任务
+        当有任务完成时调用，按空闲槽位数依次启动队首任务，
+        并唤醒在 execute_with_timeout 中等待准入的执行协程
         """
-        while self._pending_queue and self.can_start_new_task():
-            next_task_id = self._pending_queue[0]
-            task = self._tasks.get(next_task_id)
+        if not self._pending_queue:
+            return
+        # 循环内不会替换这些容器对象，绑定为局部变量（运行中集合由 start_task 原地更新）
+        pending = self._pending_queue
+        tasks = self._tasks
+        waiters = self._admission_waiters
+        running = self._tasks_by_status[AsyncTaskStatus.RUNNING]
+        cap = self._max_concurrent_tasks
+        while pending and len(running) < cap:
+            next_task_id = pending[0]
+            task = tasks.get(next_task_id)
             if task and task.status == AsyncTaskStatus.PENDING:
-                # 任务仍在等待，可以启动
-                self._pending_queue.pop(0)
-                print(f"[AsyncTaskManager] ⏭️  从等待队列启动任务 {next_task_id[:8]}... | "
-                      f"剩余队列: {len(self._pending_queue)}")
-                # 注意：实际启动需要外部调用者处理
-                break
+                # 任务仍在等待：start_task 会将其出队并占用并发槽位
+                self.start_task(next_task_id)
+                waiter = waiters.get(next_task_id)
+                if waiter is not None and not waiter.done():
+                    waiter.set_result(None)
             else:
                 # 任务已被取消或状态改变，从队列移除
-                self._pending_queue.pop(0)
+                self._popleft_pending()
     
     def get_next_pending_task(self) -> Optional[str]:
         """获取下一个等待执行的任务ID
@@ -1080,32 +1585,42 @@ class AsyncTaskManager:
         if not self._pending_queue or not self.can_start_new_task():
             return None
         
-        # 查找第一个仍在等待状态的任务
-        for task_id in self._pending_queue:
-            task = self._tasks.get(task_id)
+        # 查找第一个仍在等待状态的任务，途经的失效条目直接出队，后续调用无需重复扫描
+        # （队首始终不是墓碑，_popleft_pending 出队后会继续丢弃新队首的墓碑）
+        pending = self._pending_queue
+        tasks = self._tasks
+        while pending:
+            task_id = pending[0]
+            task = tasks.get(task_id)
             if task and task.status == AsyncTaskStatus.PENDING:
                 return task_id
-        
+            self._popleft_pending()
+
         return None
     
     def cleanup_completed_tasks(self):
-        """清理所有已完成的任务（内存中）"""
-        to_delete = []
-        for task_id, task in self._tasks.items():
-            if task.status in [
-                AsyncTaskStatus.COMPLETED,
-                AsyncTaskStatus.FAILED,
-                AsyncTaskStatus.CANCELLED,
-                AsyncTaskStatus.TIMEOUT
-            ]:
-                to_delete.append(task_id)
+        """清理所有已完成的任务（内存中）
+
+        待删除任务直接取自按状态分组的索引；等待队列整体重建一次，其余映射只删除交集中的键，
+        总开销与已完成任务数线性相关。
+        """
+        by_status = self._tasks_by_status
+        to_delete = set().union(*(by_status[status] for status in _TERMINAL_STATUSES))
+        if not to_delete:
+            return
+        for status in _TERMINAL_STATUSES:
+            by_status[status] = set()
 
         for task_id in to_delete:
             del self._tasks[task_id]
-            if task_id in self._running_tasks:
-                del self._running_tasks[task_id]
-            if task_id in self._pending_queue:
-                self._pending_queue.remove(task_id)
+
+        if not to_delete.isdisjoint(self._queue_positions):
+            self._rebuild_pending(to_delete)
+
+        for mapping in (self._running_tasks, self._task_user_ids, self._progress_cache,
+                        self._db_pk_cache, self._sync_failures):
+            for task_id in to_delete.intersection(mapping):
+                del mapping[task_id]
 
     async def shutdown(self) -> None:
         """优雅关闭任务管理器
@@ -1113,31 +1628,41 @@ class AsyncTaskManager:
         停止所有后台任务，取消正在运行的 AI 调用任务，
         并确保所有日志都被刷新到数据库。
         """
-        print("[AsyncTaskManager] 开始关闭...")
+        logger.info("开始关闭...")
 
-        # 1. 取消所有正在运行的 AI 调用任务
-        for task_id, asyncio_task in list(self._running_tasks.items()):
-            print(f"[AsyncTaskManager] 取消任务: {task_id}")
+        # 1. 取消所有正在运行的 AI 调用任务：先全部发出取消，再并发等待退出
+        running = list(self._running_tasks.items())
+        for task_id, asyncio_task in running:
+            logger.info("取消任务: %s", task_id)
             asyncio_task.cancel()
+        if running:
+            await asyncio.gather(*(asyncio_task for _, asyncio_task in running), return_exceptions=True)
+        self._running_tasks.clear()
+
+        # 2. 标记所有运行中的任务为取消状态（同一时刻取消，时间戳只取一次）
+        now = time.time()
+        cancelled = {task_id: self._tasks[task_id]
+                     for task_id in self._tasks_by_status[AsyncTaskStatus.RUNNING]}
+        for task in cancelled.values():
+            self._set_task_status(task, AsyncTaskStatus.CANCELLED)
+            task.error = "服务关闭，任务被取消"
+            task.completed_at = now
+            task.mark_dirty("error", "completed_at")
+        # 一次事务批量同步到数据库（直接调用，不通过队列）
+        await self._bulk_sync_to_db(cancelled)
+
+        # 3. 停止内存监控任务
+        if self._memory_monitor_task and not self._memory_monitor_task.done():
+            self._memory_monitor_task.cancel()
             try:
-                await asyncio_task
+                await self._memory_monitor_task
             except asyncio.CancelledError:
                 pass
-        self._running_tasks.clear()
-
-        # 2. 标记所有运行中的任务为取消状态
-        for task_id, task in list(self._tasks.items()):
-            if task.status == AsyncTaskStatus.RUNNING:
-                task.status = AsyncTaskStatus.CANCELLED
-                task.error = "服务关闭，任务被取消"
-                task.completed_at = datetime.utcnow()
-                # 同步到数据库（直接调用，不通过队列）
-                await self._do_sync_to_db(task_id, task)
 
-        # 3. 停止数据库写入工作线程（会先刷新日志缓冲区）
+        # 4. 停止数据库写入工作线程（会先刷新日志缓冲区）
         await self._stop_db_worker()
 
-        print("[AsyncTaskManager] 关闭完成")
+        logger.info("关闭完成")
 
     def add_step_log(
         self,
@@ -1219,8 +1744,9 @@ class AsyncTaskManager:
             estimated_tokens: 估算的 Token 数量
         """
         # 打印智能体调用日志
-        print(f"[AsyncTaskManager] 🤖 任务 {task_id[:8]}... | "
-              f"{agent_name}({agent_type}) | {model_name}@{provider} | {message}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("🤖 任务 %s... | %s(%s) | %s@%s | %s",
+                         task_id[:8], agent_name, agent_type, model_name, provider, message)
 
         self.add_log(
             task_id,
@@ -1245,6 +1771,10 @@ class AsyncTaskManager:
             "retry_count": self._retry_count,
             "queue_size": self._queue_size,
             "config_loaded": self._config_loaded,
+            "max_cached_tasks": self._max_cached_tasks,
+            "log_flush_threshold": self._log_flush_threshold,
+            "log_level": self._log_level,
+            "logger_level": logging.getLevelName(logger.getEffectiveLevel()),
             "running_tasks": self.get_running_task_count(),
             "pending_tasks": self.get_pending_task_count()
         }
@@ -0,0 +1,35 @@
+"""
+测试公共配置
+
+在导入应用模块之前把数据库指向临时 SQLite 文件，避免读写开发数据库
+"""
+import os
+import sys
+import tempfile
+
+_TEST_DB_DIR = tempfile.mkdtemp(prefix="testflow-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_TEST_DB_DIR, 'test.db')}"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+import app.models  # noqa: F401  注册全部模型
+from app.database import SessionLocal, create_tables, drop_tables
+from app.models.user import User, UserRole
+
+
+@pytest.fixture
+def db_user_id():
+    """建表并创建一个测试用户，返回用户 ID；测试结束后删除所有表"""
+    create_tables()
+    db = SessionLocal()
+    try:
+        user = User(username="tester", email="tester@example.com",
+                    password_hash="x", role=UserRole.ADMIN)
+        db.add(user)
+        db.commit()
+        user_id = user.id
+    finally:
+        db.close()
+    yield user_id
+    drop_tables()
@@ -0,0 +1,275 @@
+"""
+异步任务管理器测试
+"""
+import asyncio
+
+import pytest
+
+from app.database import SessionLocal
+from app.models.task import AsyncTask as AsyncTaskModel, AsyncTaskLog
+from app.services.async_task_manager import AsyncTaskManager
+
+
+@pytest.mark.asyncio
+async def test_log_burst_keeps_logs_of_queued_tasks(db_user_id):
+    """突发创建大量任务时，日志不能先于任务记录写入（外键失败导致整批日志丢失）"""
+    manager = AsyncTaskManager()
+    manager._max_concurrent_tasks = 1000
+    manager._queue_size = 1000
+    await manager.start()
+
+    count = AsyncTaskManager._DB_BATCH_MAX + 50
+    for _ in range(count):
+        task_id = manager.create_task("burst")
+        manager.set_task_user_id(task_id, db_user_id)
+        manager.add_log(task_id, "任务已创建")
+    await asyncio.sleep(0)
+
+    await manager.shutdown()
+
+    db = SessionLocal()
+    try:
+        assert db.query(AsyncTaskModel).count() == count
+        assert db.query(AsyncTaskLog).count() == count
+    finally:
+        db.close()
+
+
+@pytest.mark.asyncio
+async def test_log_batch_fallback_skips_only_orphan_rows(db_user_id):
+    """日志批量写入失败时只丢弃任务记录不存在的行"""
+    manager = AsyncTaskManager()
+    task_id = manager.create_task("fallback")
+    manager.set_task_user_id(task_id, db_user_id)
+
+    db = SessionLocal()
+    try:
+        await manager._do_sync_batch(db, {task_id: manager.get_task(task_id)})
+        await manager._do_add_log_batch(db, [
+            (task_id, {"type": "log", "level": "info", "message": "ok"}),
+            ("missing-task", {"type": "log", "level": "info", "message": "orphan"}),
+        ])
+        messages = [log.message for log in db.query(AsyncTaskLog).all()]
+    finally:
+        db.close()
+
+    assert messages == ["ok"]
+
+
+def test_memory_pressure_eviction_keeps_recently_finished_tasks():
+    """内存压力淘汰只移除结束足够久的终态任务，刚结束和未结束的任务保留"""
+    manager = AsyncTaskManager()
+    old_ids = [manager.create_task("old") for _ in range(3)]
+    for task_id in old_ids:
+        manager.fail_task(task_id, "boom")
+        manager.get_task(task_id).completed_at -= 3600
+    recent_id = manager.create_task("recent")
+    manager.fail_task(recent_id, "boom")
+    running_id = manager.create_task("running")
+    manager.start_task(running_id)
+
+    removed = manager._evict_finished_tasks(limit=1, min_age=AsyncTaskManager._MEMORY_EVICT_MIN_AGE)
+
+    assert removed == 3
+    assert manager.get_task_status(recent_id) is not None
+    assert manager.get_task_status(running_id) is not None
+    assert all(manager.get_task(task_id) is None for task_id in old_ids)
+
+
+def test_pending_queue_tombstones_survive_requeue():
+    """同一任务在队列中间被移除、重新入队、再次移除后，队列计数和出队仍然正确"""
+    manager = AsyncTaskManager()
+    manager._max_concurrent_tasks = 1
+    manager.start_task(manager.create_task("running"))
+    ids = [manager.create_task("queued") for _ in range(4)]
+    target = ids[1]
+
+    assert manager._remove_pending(target)
+    assert not manager.start_task(target)  # 无空闲槽位，重新入队到队尾
+    assert manager._queue_position(target) == 4
+    assert manager._remove_pending(target)
+    assert manager.get_pending_task_count() == 3
+
+    drained = []
+    while manager._pending_queue:
+        drained.append(manager._popleft_pending())
+    assert drained == [ids[0], ids[2], ids[3]]
+    assert manager.get_pending_task_count() == 0
+
+
+@pytest.mark.asyncio
+async def test_sync_batch_isolates_bad_rows(db_user_id):
+    """批量同步中个别任务写入失败时，其他任务照常提交，失败任务重新标记为脏等待重试"""
+    manager = AsyncTaskManager()
+    task_ids = [manager.create_task("batch") for _ in range(3)]
+    tasks = {}
+    for task_id in task_ids:
+        manager.set_task_user_id(task_id, db_user_id)
+        tasks[task_id] = manager.get_task(task_id)
+
+    db = SessionLocal()
+    try:
+        await manager._do_sync_batch(db, tasks)
+        for task_id, result in zip(task_ids, ({"ok": 1}, {"bad": object()}, {"ok": 3})):
+            manager.complete_task(task_id, result)
+        await manager._do_sync_batch(db, tasks)
+
+        statuses = dict(db.query(AsyncTaskModel.task_id, AsyncTaskModel.status).all())
+    finally:
+        db.close()
+
+    assert statuses[task_ids[0]].value == "completed"
+    assert statuses[task_ids[1]].value == "pending"
+    assert statuses[task_ids[2]].value == "completed"
+    assert task_ids[1] in manager._dirty_tasks
+    assert manager.get_task(task_ids[1])._dirty
+    assert not manager.get_task(task_ids[0])._dirty
+
+
+@pytest.mark.asyncio
+async def test_task_result_with_big_integer_is_persisted(db_user_id):
+    """超出 64 位的整数结果可以写入数据库并原样读回"""
+    manager = AsyncTaskManager()
+    task_id = manager.create_task("big")
+    manager.set_task_user_id(task_id, db_user_id)
+    manager.complete_task(task_id, {"big": 2 ** 70})
+
+    db = SessionLocal()
+    try:
+        await manager._do_sync_batch(db, {task_id: manager.get_task(task_id)})
+        row = db.query(AsyncTaskModel).filter_by(task_id=task_id).one()
+        assert row.status.value == "completed"
+        assert row.result == {"big": 2 ** 70}
+    finally:
+        db.close()
+
+
+@pytest.mark.asyncio
+async def test_memory_monitor_evicts_old_finished_tasks_below_cache_cap(monkeypatch):
+    """内存超过阈值时，即使任务数远低于缓存上限，也会淘汰结束足够久的终态任务"""
+    from app.services import async_task_manager as module
+
+    monkeypatch.setattr(module, "_current_rss_bytes", lambda: 1024 * 1024 * 1024)
+    monkeypatch.setattr(module.settings, "task_memory_high_mb", 1)
+    manager = AsyncTaskManager()
+    manager._MEMORY_CHECK_INTERVAL_LOW = manager._MEMORY_CHECK_INTERVAL_HIGH = 0.01
+    old_id = manager.create_task("old")
+    manager.fail_task(old_id, "boom")
+    manager.get_task(old_id).completed_at -= 3600
+    recent_id = manager.create_task("recent")
+    manager.fail_task(recent_id, "boom")
+
+    monitor = asyncio.create_task(manager._memory_monitor_loop())
+    await asyncio.sleep(0.05)
+    manager._shutdown_event.set()
+    await monitor
+
+    assert manager.get_task(old_id) is None
+    assert manager.get_task(recent_id) is not None
+
+
+async def _start_queued_tasks(manager, user_id, count, work):
+    """按接口层的方式创建并启动任务：超出并发上限的任务在 execute_with_timeout 中等待准入"""
+    task_ids = []
+    runners = []
+
+    async def run(task_id):
+        result = await manager.execute_with_timeout(task_id, work(task_id))
+        manager.complete_task(task_id, result)
+
+    for _ in range(count):
+        task_id = manager.create_task("queued")
+        manager.set_task_user_id(task_id, user_id)
+        manager.start_task(task_id)
+        runner = asyncio.create_task(run(task_id))
+        manager.register_running_task(task_id, runner)
+        task_ids.append(task_id)
+        runners.append(runner)
+    return task_ids, runners
+
+
+@pytest.mark.asyncio
+async def test_admission_honours_cap_in_fifo_order(db_user_id):
+    """同时运行的任务数不超过并发上限，排队任务按入队顺序启动"""
+    manager = AsyncTaskManager()
+    manager._max_concurrent_tasks = 2
+    running = set()
+    peak = 0
+    started = []
+
+    async def work(task_id):
+        nonlocal peak
+        started.append(task_id)
+        running.add(task_id)
+        peak = max(peak, len(running))
+        await asyncio.sleep(0.01)
+        running.discard(task_id)
+        return {"ok": True}
+
+    task_ids, runners = await _start_queued_tasks(manager, db_user_id, 6, work)
+    assert manager.get_pending_task_count() == 4
+    await asyncio.gather(*runners)
+
+    assert peak == 2
+    assert started == task_ids
+    assert manager.get_running_task_count() == 0
+    assert manager.get_pending_task_count() == 0
+    await manager.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_cancel_while_queued_never_runs_task(db_user_id):
+    """排队中被取消的任务不会执行，也不占用并发槽位"""
+    manager = AsyncTaskManager()
+    manager._max_concurrent_tasks = 1
+    release = asyncio.Event()
+    started = []
+
+    async def work(task_id):
+        started.append(task_id)
+        await release.wait()
+        return {}
+
+    task_ids, runners = await _start_queued_tasks(manager, db_user_id, 3, work)
+    await asyncio.sleep(0)
+    manager.cancel_task(task_ids[1])
+    assert manager.get_pending_task_count() == 1
+    release.set()
+    results = await asyncio.gather(*runners, return_exceptions=True)
+
+    assert started == [task_ids[0], task_ids[2]]
+    assert isinstance(results[1], asyncio.CancelledError)
+    assert manager.get_task(task_ids[1]).status.value == "cancelled"
+    assert manager._admission_waiters == {}
+    await manager.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_admission_wait_timeout_releases_queue_slot(db_user_id):
+    """等待准入时超时或被外部取消，任务移出等待队列，之后不会被启动占用槽位"""
+    manager = AsyncTaskManager()
+    manager._max_concurrent_tasks = 1
+    release = asyncio.Event()
+
+    async def blocked():
+        await release.wait()
+        return {}
+
+    first = manager.create_task("first")
+    manager.start_task(first)
+    queued = [manager.create_task("queued") for _ in range(2)]
+    for task_id in queued:
+        manager.start_task(task_id)
+
+    with pytest.raises(TimeoutError):
+        await asyncio.wait_for(manager.execute_with_timeout(queued[0], blocked()), 0.01)
+    waiter = asyncio.create_task(manager.execute_with_timeout(queued[1], blocked()))
+    await asyncio.sleep(0)
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+
+    assert manager.get_pending_task_count() == 0
+    assert manager._admission_waiters == {}
+    manager.complete_task(first, {})
+    assert manager.get_running_task_count() == 0
@@ -0,0 +1,17 @@
+"""
+数据库 JSON 序列化测试
+"""
+import math
+
+from app.database import json_dumps, json_loads
+
+
+def test_json_round_trips_integers_beyond_64_bits():
+    """orjson 不支持的大整数退回标准库 json，读回时保持精度"""
+    value = {"big": 2 ** 70, "neg": -(2 ** 70), "items": [1, "中文"]}
+    assert json_loads(json_dumps(value)) == value
+
+
+def test_json_loads_accepts_stdlib_nan():
+    """标准库 json 写出的 NaN 仍能读回"""
+    assert math.isnan(json_loads('{"n": NaN}')["n"])
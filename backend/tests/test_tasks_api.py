@@ -0,0 +1,34 @@
+"""
+任务管理 API 测试
+"""
+import pytest
+from pydantic import ValidationError
+
+from app.api.tasks import _delete_final_tasks
+from app.config import Settings
+from app.database import SessionLocal
+from app.models.task import AsyncTask, AsyncTaskStatus
+
+
+@pytest.mark.parametrize("batch_size", [0, -1])
+def test_cleanup_batch_size_must_be_positive(batch_size):
+    """非正的清理批大小会让分批删除循环无法结束，配置时直接拒绝"""
+    with pytest.raises(ValidationError):
+        Settings(task_cleanup_batch_size=batch_size)
+
+
+def test_delete_final_tasks_deletes_in_batches(db_user_id):
+    """分批删除全部终态任务，保留未结束的任务"""
+    db = SessionLocal()
+    try:
+        statuses = [AsyncTaskStatus.COMPLETED] * 5 + [AsyncTaskStatus.RUNNING]
+        db.add_all(
+            AsyncTask(task_id=f"task-{i}", task_type="t", status=task_status, user_id=db_user_id)
+            for i, task_status in enumerate(statuses)
+        )
+        db.commit()
+
+        assert _delete_final_tasks(db, batch_size=2) == 5
+        assert [task.status for task in db.query(AsyncTask).all()] == [AsyncTaskStatus.RUNNING]
+    finally:
+        db.close()
@@ -11,13 +11,16 @@ export interface TaskListParams {
   page_size?: number
   sort_by?: string
   order?: 'asc' | 'desc'
+  cursor?: string  // 游标分页：上一页返回的 next_cursor
+  include_total?: boolean  // 是否统计总数，默认 true
 }
 
 export interface TaskListResponse {
   tasks: TaskItem[]
-  total: number
+  total: number | null  // 游标分页或 include_total=false 时不统计总数，为 null
   page: number
   page_size: number
+  next_cursor?: string | null  // 下一页游标（按 created_at 排序时提供）
 }
 
 export interface TaskItem {
@@ -121,8 +124,8 @@ export const taskApi = {
   /**
    * 获取任务日志
    */
-  getTaskLogs(taskId: string): Promise<TaskLogResponse> {
-    return request.get(`/tasks/${taskId}/logs`)
+  getTaskLogs(taskId: string, params?: { page?: number; page_size?: number }): Promise<TaskLogResponse> {
+    return request.get(`/tasks/${taskId}/logs`, { params })
   },
 
   /**
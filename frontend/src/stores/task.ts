@@ -49,7 +49,7 @@ export const useTaskStore = defineStore('task', () => {
       const cached = cache.value.get(cacheKey)
       if (cached && Date.now() - cached.timestamp < CACHE_TTL) {
         tasks.value = cached.data.tasks
-        total.value = cached.data.total
+        total.value = cached.data.total ?? total.value
         return
       }
     }
@@ -62,7 +62,8 @@ export const useTaskStore = defineStore('task', () => {
       })
 
       tasks.value = response.tasks
-      total.value = response.total
+      // 未统计总数（游标分页或 include_total=false）时沿用上一次的总数
+      total.value = response.total ?? total.value
 
       // 更新缓存
       cache.value.set(cacheKey, {